@@ -0,0 +1,28 @@
+"""Image variant rendering for the media derivation worker processes.
+
+Kept apart from server.py so that worker processes only import Pillow, not the
+application, its database clients and its threads.
+"""
+import io
+from typing import Dict
+
+from PIL import Image, ImageOps
+
+# Derived image variants: name -> longest side in pixels
+MEDIA_VARIANTS = {"thumb": 160, "preview": 640}
+
+
+def render_image_variants(data: bytes) -> Dict[str, bytes]:
+    """Return WebP bytes for every entry of MEDIA_VARIANTS"""
+    with Image.open(io.BytesIO(data)) as image:
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+        rendered = {}
+        for name, max_side in MEDIA_VARIANTS.items():
+            variant = image.copy()
+            variant.thumbnail((max_side, max_side), Image.LANCZOS)
+            output = io.BytesIO()
+            variant.save(output, format="WEBP", quality=80, method=4)
+            rendered[name] = output.getvalue()
+        return rendered
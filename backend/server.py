@@ -1,20 +1,40 @@
-from fastapi import FastAPI, APIRouter, HTTPException, status, Depends
+from fastapi import FastAPI, APIRouter, HTTPException, status, Depends, Query, Request, Response
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
+from starlette.responses import StreamingResponse, RedirectResponse
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorGridFSBucket
+from fastapi.encoders import jsonable_encoder
+from pymongo import IndexModel, ASCENDING, DESCENDING, ReturnDocument, CursorType, UpdateOne
+from pymongo.errors import OperationFailure, DuplicateKeyError, CollectionInvalid, BulkWriteError, ConnectionFailure
 import os
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field, EmailStr
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, AsyncIterator
+from abc import ABC, abstractmethod
+import re
 import uuid
-from datetime import datetime, timedelta
+import json
+import base64
+import hashlib
+import time
+import asyncio
+import multiprocessing
+from collections import defaultdict, OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
 from passlib.context import CryptContext
 from jose import jwt, JWTError
 import socketio
+from socketio.async_manager import AsyncManager
+from socketio.async_pubsub_manager import AsyncPubSubManager
 from bson import ObjectId
 import razorpay
+import aiofiles
+import aiofiles.os
+from python_multipart.multipart import MultipartParser, parse_options_header
+from media_variants import MEDIA_VARIANTS, render_image_variants
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -47,14 +67,178 @@ otp_storage = {}  # In production, use Redis
 
 security = HTTPBearer()
 
+# ==================== SOCKET.IO PUB/SUB ====================
+
+# Socket.IO client managers that relay emits, room changes and disconnects
+# between Socket.IO servers: the JSON and MessagePack servers of a process, and
+# the servers of other workers. SOCKETIO_PUBSUB selects one: "local" (the
+# default) calls the other server of the process directly, "memory" relays
+# within the process through a queue, "mongo" relays between workers.
+SOCKETIO_PUBSUB = os.environ.get("SOCKETIO_PUBSUB", "local")
+# The MessagePack server can be switched off; the JSON server then runs alone
+# with the plain client manager
+SOCKETIO_MSGPACK = os.environ.get("SOCKETIO_MSGPACK", "true").lower() == "true"
+SOCKETIO_PUBSUB_COLLECTION_SIZE = int(os.environ.get("SOCKETIO_PUBSUB_COLLECTION_SIZE", 16 * 1024 * 1024))
+
+class SiblingManager(AsyncManager):
+    """Client manager of one of the two servers of a process that hands anything
+    addressed to sockets of the other server straight to its manager. Emits to the
+    other server return at once while it has no clients."""
+
+    def __init__(self):
+        super().__init__()
+        self.sibling: Optional["SiblingManager"] = None
+
+    def pair(self, sibling: "SiblingManager"):
+        self.sibling, sibling.sibling = sibling, self
+
+    def _owner(self, sid, namespace) -> AsyncManager:
+        if self.sibling is not None and not self.is_connected(sid, namespace) and self.sibling.is_connected(sid, namespace):
+            return self.sibling
+        return self
+
+    async def emit(self, event, data, namespace, room=None, skip_sid=None, callback=None, to=None, **kwargs):
+        room = to or room
+        await super().emit(event, data, namespace, room=room, skip_sid=skip_sid, callback=callback, **kwargs)
+        if self.sibling is not None and callback is None:
+            await AsyncManager.emit(self.sibling, event, data, namespace, room=room, skip_sid=skip_sid, **kwargs)
+
+    async def can_disconnect(self, sid, namespace):
+        owner = self._owner(sid, namespace)
+        if owner is self:
+            return await super().can_disconnect(sid, namespace)
+        await owner.server.disconnect(sid, namespace=namespace)
+        return False
+
+    async def enter_room(self, sid, namespace, room, eio_sid=None):
+        owner = self._owner(sid, namespace)
+        if owner is self:
+            return await super().enter_room(sid, namespace, room, eio_sid=eio_sid)
+        return await AsyncManager.enter_room(owner, sid, namespace, room)
+
+    async def leave_room(self, sid, namespace, room):
+        return await AsyncManager.leave_room(self._owner(sid, namespace), sid, namespace, room)
+
+    async def close_room(self, room, namespace):
+        await super().close_room(room, namespace)
+        if self.sibling is not None:
+            await AsyncManager.close_room(self.sibling, room, namespace)
+
+class InMemoryPubSubManager(AsyncPubSubManager):
+    """Relays messages between servers that live in the same process"""
+    name = "inmemory"
+    channels: Dict[str, List[asyncio.Queue]] = defaultdict(list)
+
+    def __init__(self, channel="socketio", write_only=False, logger=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+        self.queue = asyncio.Queue()
+        if not write_only:
+            self.channels[channel].append(self.queue)
+
+    async def _publish(self, data):
+        for queue in self.channels[self.channel]:
+            queue.put_nowait(data)
+
+    async def _listen(self):
+        while True:
+            yield await self.queue.get()
+
+class MongoPubSubManager(AsyncPubSubManager):
+    """Relays messages through a capped MongoDB collection read with a tailable
+    cursor, so multiple workers need no infrastructure beyond the database"""
+    name = "mongo"
+    # Application messages sharing the channel: method -> handler(message), run
+    # by every worker (including the publisher) instead of reaching Socket.IO
+    app_handlers: Dict[str, Any] = {}
+
+    def __init__(self, database, collection_name="socketio_pubsub", channel="socketio", write_only=False, logger=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+        self.database = database
+        self.collection_name = collection_name
+        self.collection = database[collection_name]
+        self.ready = False
+
+    async def _ensure_collection(self):
+        if self.ready:
+            return
+        try:
+            await self.database.create_collection(
+                self.collection_name, capped=True, size=SOCKETIO_PUBSUB_COLLECTION_SIZE
+            )
+        except (CollectionInvalid, OperationFailure):
+            pass  # Created by another worker
+        self.ready = True
+
+    async def _publish(self, data):
+        await self._ensure_collection()
+        await self.collection.insert_one({"channel": self.channel, "message": data, "created_at": datetime.utcnow()})
+
+    async def _listen(self):
+        await self._ensure_collection()
+        last_id = await self._latest_id()
+        while True:
+            if await self.collection.find_one({"_id": last_id}, {"_id": 1}) is None:
+                logging.warning("Socket.IO pub/sub collection wrapped around before it was read; messages may have been lost")
+                last_id = await self._latest_id()
+            # Tail in natural (insertion) order and skip up to the last document seen.
+            # _id values are made by each publisher's driver and do not sort in insertion
+            # order across processes, so they cannot be used as a resume filter.
+            cursor = self.collection.find({}, {"_id": 1, "channel": 1, "message": 1}, cursor_type=CursorType.TAILABLE_AWAIT)
+            caught_up = False
+            async for document in cursor:
+                if not caught_up:
+                    caught_up = document["_id"] == last_id
+                    continue
+                last_id = document["_id"]
+                if document.get("channel") != self.channel:
+                    continue
+                message = document["message"]
+                handler = self.app_handlers.get(message.get("method")) if isinstance(message, dict) else None
+                if handler is not None:
+                    handler(message)
+                else:
+                    yield message
+            # The cursor dies when the collection wraps around past its position
+            await asyncio.sleep(0.5)
+
+    async def _latest_id(self):
+        latest = await self.collection.find_one({}, {"_id": 1}, sort=[("$natural", DESCENDING)])
+        if latest is None:
+            # A tailable cursor on an empty capped collection dies immediately
+            return (await self.collection.insert_one({"channel": None, "created_at": datetime.utcnow()})).inserted_id
+        return latest["_id"]
+
+def create_client_manager():
+    if SOCKETIO_PUBSUB == "mongo":
+        return MongoPubSubManager(db)
+    if SOCKETIO_PUBSUB == "memory":
+        return InMemoryPubSubManager()
+    return SiblingManager() if SOCKETIO_MSGPACK else AsyncManager()
+
 # Socket.IO setup
 sio = socketio.AsyncServer(
     async_mode='asgi',
     cors_allowed_origins='*',
+    client_manager=create_client_manager(),
     logger=True,
     engineio_logger=True
 )
 
+# Clients opt into binary MessagePack packets by connecting with
+# path=/socket.io-msgpack (e.g. socket.io-msgpack-parser). Both servers run the
+# same event handlers and reach each other's sockets through the client manager.
+SOCKETIO_MSGPACK_PATH = "socket.io-msgpack"
+sio_msgpack = socketio.AsyncServer(
+    async_mode='asgi',
+    cors_allowed_origins='*',
+    client_manager=create_client_manager(),
+    serializer='msgpack',
+    logger=True,
+    engineio_logger=True
+) if SOCKETIO_MSGPACK else None
+if isinstance(sio.manager, SiblingManager):
+    sio.manager.pair(sio_msgpack.manager)
+
 # Create the main app without a prefix
 app = FastAPI()
 
@@ -62,7 +246,10 @@ app = FastAPI()
 api_router = APIRouter(prefix="/api")
 
 # Wrap FastAPI with Socket.IO
-socket_app = socketio.ASGIApp(sio, app)
+if SOCKETIO_MSGPACK:
+    socket_app = socketio.ASGIApp(sio, socketio.ASGIApp(sio_msgpack, app, socketio_path=SOCKETIO_MSGPACK_PATH))
+else:
+    socket_app = socketio.ASGIApp(sio, app)
 
 # ==================== MODELS ====================
 
@@ -185,6 +372,10 @@ class ChatRoom(BaseModel):
     chat_type: str = "venue_artist"  # "venue_artist", "venue_partner", or "artist_artist"
     created_at: datetime = Field(default_factory=datetime.utcnow)
     last_message_at: Optional[datetime] = None
+    last_message: Optional[dict] = None  # Snapshot written with every message, see record_room_message
+    last_read_at: Dict[str, datetime] = {}  # Read cursor per participant user id, see mark_room_read
+    updated_at: datetime = Field(default_factory=datetime.utcnow)  # Any change seen by the chat list, for delta sync
+    message_seq: int = 0  # Sequence number of the room's latest message
 
 class Message(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -193,6 +384,8 @@ class Message(BaseModel):
     message: str
     is_read: bool = False
     created_at: datetime = Field(default_factory=datetime.utcnow)
+    seq: Optional[int] = None  # Per-room sequence number, allocated from chat_rooms.message_seq
+    client_message_id: Optional[str] = None  # Sender-chosen id; resending it never creates a second message
 
 # ==================== NEW MODELS FOR MINI-BATCH 1 ====================
 
@@ -278,15 +471,326 @@ class OTPVerification(BaseModel):
     expires_at: datetime
     is_verified: bool = False
 
+# ==================== DATABASE INDEXES ====================
+
+# Indexes the API relies on, declared per collection. ensure_indexes() creates
+# missing ones and rebuilds any whose definition drifted from what is declared here.
+# Set INDEX_RECONCILE_ON_STARTUP=false to leave that to `python server.py ensure-indexes`.
+CHAT_TOMBSTONE_TTL_DAYS = 30
+
+INDEX_SPECS = {
+    "users": [
+        IndexModel([("id", ASCENDING)], name="users_id", unique=True),
+        IndexModel([("email", ASCENDING)], name="users_email", unique=True),
+    ],
+    "artist_profiles": [
+        IndexModel([("id", ASCENDING)], name="artist_profiles_id", unique=True),
+        IndexModel([("user_id", ASCENDING)], name="artist_profiles_user_id"),
+        # get_artists price filter: both $or branches equality/range on price_per_hour
+        IndexModel(
+            [("pricing.price_per_hour", ASCENDING), ("pricing.is_for_promotion", ASCENDING), ("rating", DESCENDING)],
+            name="artist_profiles_price_rating"
+        ),
+        IndexModel(
+            [("locations", ASCENDING), ("pricing.price_per_hour", ASCENDING), ("rating", DESCENDING)],
+            name="artist_profiles_location_price_rating"
+        ),
+        IndexModel([("rating", DESCENDING), ("id", ASCENDING)], name="artist_profiles_rating_page"),
+        IndexModel([("is_featured", ASCENDING), ("rating", DESCENDING), ("id", ASCENDING)], name="artist_profiles_featured_page"),
+    ],
+    "partner_profiles": [
+        IndexModel([("id", ASCENDING)], name="partner_profiles_id", unique=True),
+        IndexModel([("user_id", ASCENDING)], name="partner_profiles_user_id"),
+        IndexModel([("rating", DESCENDING), ("id", ASCENDING)], name="partner_profiles_rating_page"),
+        IndexModel([("is_featured", ASCENDING), ("rating", DESCENDING), ("id", ASCENDING)], name="partner_profiles_featured_page"),
+    ],
+    "venue_profiles": [
+        IndexModel([("id", ASCENDING)], name="venue_profiles_id", unique=True),
+        IndexModel([("user_id", ASCENDING)], name="venue_profiles_user_id"),
+    ],
+    "reviews": [
+        IndexModel([("profile_id", ASCENDING), ("reviewer_id", ASCENDING)], name="reviews_profile_reviewer"),
+        IndexModel([("reviewer_id", ASCENDING)], name="reviews_reviewer_id"),
+        IndexModel(
+            [("profile_id", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)],
+            name="reviews_profile_page"
+        ),
+    ],
+    "wishlists": [
+        IndexModel([("venue_user_id", ASCENDING), ("profile_id", ASCENDING)], name="wishlists_venue_profile"),
+        IndexModel(
+            [("venue_user_id", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)],
+            name="wishlists_venue_page"
+        ),
+    ],
+    "chat_rooms": [
+        IndexModel([("id", ASCENDING)], name="chat_rooms_id", unique=True),
+        IndexModel([("participant1_id", ASCENDING), ("participant2_id", ASCENDING)], name="chat_rooms_participants"),
+        IndexModel([("participant2_id", ASCENDING)], name="chat_rooms_participant2_id"),
+        IndexModel([("venue_user_id", ASCENDING), ("provider_user_id", ASCENDING)], name="chat_rooms_venue_provider"),
+        IndexModel([("provider_user_id", ASCENDING)], name="chat_rooms_provider_user_id"),
+        IndexModel([("created_at", DESCENDING), ("id", DESCENDING)], name="chat_rooms_page"),
+    ],
+    "chat_room_tombstones": [
+        IndexModel([("user_ids", ASCENDING), ("deleted_at", ASCENDING)], name="chat_room_tombstones_user"),
+        IndexModel(
+            [("deleted_at", ASCENDING)], name="chat_room_tombstones_ttl",
+            expireAfterSeconds=CHAT_TOMBSTONE_TTL_DAYS * 24 * 3600
+        ),
+    ],
+    "socket_presence": [
+        IndexModel([("user_id", ASCENDING), ("worker_id", ASCENDING)], name="socket_presence_user_worker", unique=True),
+        # Entries of workers that died without cleaning up
+        IndexModel([("seen_at", ASCENDING)], name="socket_presence_ttl", expireAfterSeconds=3600),
+    ],
+    "messages": [
+        IndexModel(
+            [("chat_room_id", ASCENDING), ("created_at", ASCENDING), ("id", ASCENDING)],
+            name="messages_room_created"
+        ),
+        IndexModel(
+            [("chat_room_id", ASCENDING), ("seq", ASCENDING)], name="messages_room_seq", unique=True,
+            partialFilterExpression={"seq": {"$type": "number"}}
+        ),
+        IndexModel(
+            [("chat_room_id", ASCENDING), ("client_message_id", ASCENDING)], name="messages_client_message_id",
+            unique=True, partialFilterExpression={"client_message_id": {"$type": "string"}}
+        ),
+    ],
+    "unread_counters": [
+        IndexModel([("user_id", ASCENDING)], name="unread_counters_user_id", unique=True),
+    ],
+    "collaborations": [
+        IndexModel([("id", ASCENDING)], name="collaborations_id", unique=True),
+        IndexModel([("chat_room_id", ASCENDING)], name="collaborations_chat_room_id"),
+        IndexModel([("participant1_id", ASCENDING)], name="collaborations_participant1_id"),
+        IndexModel([("participant2_id", ASCENDING)], name="collaborations_participant2_id"),
+        IndexModel(
+            [("participant1_approved", ASCENDING), ("participant2_approved", ASCENDING), ("created_at", DESCENDING)],
+            name="collaborations_approved"
+        ),
+    ],
+    "venue_subscriptions": [
+        IndexModel([("venue_user_id", ASCENDING)], name="venue_subscriptions_user"),
+    ],
+    "artist_subscriptions": [
+        IndexModel([("artist_user_id", ASCENDING)], name="artist_subscriptions_user"),
+    ],
+    "partner_subscriptions": [
+        IndexModel([("partner_user_id", ASCENDING)], name="partner_subscriptions_user"),
+    ],
+    "user_reports": [
+        IndexModel([("created_at", DESCENDING), ("id", DESCENDING)], name="user_reports_created"),
+    ],
+    "media": [
+        IndexModel([("id", ASCENDING)], name="media_id", unique=True),
+    ],
+    "payment_orders": [
+        IndexModel([("order_id", ASCENDING)], name="payment_orders_order_id"),
+    ],
+}
+
+# Query shapes issued by the API: (collection, filtered fields, where it comes from).
+# Used by the index report to point out queries that would still scan a collection.
+API_QUERIES = [
+    ("users", ["id"], "get_current_user, profile/chat lookups"),
+    ("users", ["email"], "register, login, forgot_password, admin add"),
+    ("users", ["user_type"], "admin analytics counts"),
+    ("users", ["last_login"], "admin analytics active users"),
+    ("users", ["created_at"], "admin analytics new users"),
+    ("artist_profiles", ["id"], "get_artist, update_artist, reviews, wishlist"),
+    ("artist_profiles", ["user_id"], "get_me, create_artist, chat enrichment"),
+    ("artist_profiles", ["rating", "experience_gigs", "locations", "availability"], "get_artists filters"),
+    ("artist_profiles", ["pricing.price_per_hour", "pricing.is_for_promotion"], "get_artists price filter"),
+    ("artist_profiles", ["is_featured"], "get_artists featured_only, admin analytics featured count"),
+    ("partner_profiles", ["id"], "get_partner, update_partner, reviews, wishlist"),
+    ("partner_profiles", ["user_id"], "get_me, create_partner, chat enrichment"),
+    ("partner_profiles", ["is_featured"], "get_partners featured_only, admin analytics featured count"),
+    ("venue_profiles", ["id"], "update_venue"),
+    ("venue_profiles", ["user_id"], "get_me, create_review, chat enrichment"),
+    ("reviews", ["profile_id", "reviewer_id"], "create_review duplicate check"),
+    ("reviews", ["profile_id"], "get_reviews"),
+    ("reviews", ["reviewer_id"], "delete_profile"),
+    ("wishlists", ["venue_user_id", "profile_id"], "add_to_wishlist, remove_from_wishlist, get_wishlist_entry"),
+    ("wishlists", ["venue_user_id"], "get_wishlist, delete_profile"),
+    ("chat_rooms", ["id"], "get_chat_room, get_messages, send_message, propose_collaboration"),
+    ("chat_rooms", ["participant1_id", "participant2_id"], "create_chat_room, get_chat_rooms"),
+    ("chat_rooms", ["participant2_id"], "get_chat_rooms"),
+    ("chat_rooms", ["venue_user_id", "provider_user_id"], "create_chat_room, get_chat_rooms"),
+    ("chat_rooms", ["provider_user_id"], "get_chat_rooms"),
+    ("messages", ["chat_room_id", "created_at"], "get_messages, last message lookup"),
+    ("messages", ["created_at"], "admin analytics active chats"),
+    ("messages", ["chat_room_id", "seq"], "get_messages after_seq resync"),
+    ("messages", ["chat_room_id", "client_message_id"], "send_message dedupe"),
+    ("unread_counters", ["user_id"], "send_message, mark_room_read, get_unread_counts"),
+    ("chat_room_tombstones", ["user_ids", "deleted_at"], "get_chat_rooms delta sync"),
+    ("socket_presence", ["user_id"], "get_presence"),
+    ("collaborations", ["id"], "approve_collaboration"),
+    ("collaborations", ["chat_room_id"], "propose_collaboration, get_collaborations by room"),
+    ("collaborations", ["participant1_id"], "get_collaborations"),
+    ("collaborations", ["participant2_id"], "get_collaborations"),
+    ("collaborations", ["participant1_approved", "participant2_approved"], "get_approved_collaborations"),
+    ("venue_subscriptions", ["venue_user_id"], "venue subscription endpoints"),
+    ("artist_subscriptions", ["artist_user_id"], "artist subscription endpoints"),
+    ("partner_subscriptions", ["partner_user_id"], "partner subscription endpoints"),
+    ("user_reports", ["created_at"], "get_all_reports"),
+    ("payment_orders", ["order_id"], "verify_featured_payment"),
+    ("payment_orders", ["status"], "admin analytics revenue"),
+]
+
+INDEX_OPTIONS = ("unique", "sparse", "partialFilterExpression", "expireAfterSeconds")
+
+def _index_matches(existing: dict, declared: dict) -> bool:
+    if list(existing["key"]) != list(declared["key"].items()):
+        return False
+    return all(existing.get(option) == declared.get(option) for option in INDEX_OPTIONS)
+
+# Workers start together, so only the process holding this lock changes indexes;
+# the others log the drift. The lock expires in case its holder dies mid-build.
+INDEX_RECONCILE_ON_STARTUP = os.environ.get("INDEX_RECONCILE_ON_STARTUP", "true").lower() == "true"
+INDEX_LOCK_TTL = timedelta(hours=1)
+
+async def find_index_drift() -> List[tuple]:
+    """(collection name, model, current definition or None) of every declared index that is missing or differs"""
+    drift = []
+    for collection_name, models in INDEX_SPECS.items():
+        existing = await db[collection_name].index_information()
+        for model in models:
+            current = existing.get(model.document["name"])
+            if not (current and _index_matches(current, model.document)):
+                drift.append((collection_name, model, current))
+    return drift
+
+async def acquire_maintenance_lock(name: str, holder: str, ttl: timedelta) -> bool:
+    now = datetime.utcnow()
+    try:
+        # Matches only an expired lock; a live one makes the upsert collide on _id
+        await db.maintenance_locks.update_one(
+            {"_id": name, "expires_at": {"$lt": now}},
+            {"$set": {"holder": holder, "expires_at": now + ttl}},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        return False
+    return True
+
+async def ensure_indexes(reconcile: bool = True):
+    """Create declared indexes and rebuild the ones whose definition changed.
+    Without `reconcile`, or while another process holds the lock, only log the drift."""
+    drift = await find_index_drift()
+    if not drift:
+        return
+    holder = str(uuid.uuid4())
+    if not reconcile or not await acquire_maintenance_lock("ensure_indexes", holder, INDEX_LOCK_TTL):
+        for collection_name, model, current in drift:
+            state = "differs from its declaration" if current else "is missing"
+            logging.warning(f"Index {collection_name}.{model.document['name']} {state}; run `python server.py ensure-indexes`")
+        return
+    try:
+        # Another process may have finished reconciling before the lock was free
+        for collection_name, model, current in await find_index_drift():
+            collection = db[collection_name]
+            name = model.document["name"]
+            try:
+                if current:
+                    logging.info(f"Rebuilding index {collection_name}.{name}")
+                    await collection.drop_index(name)
+                await collection.create_indexes([model])
+                logging.info(f"Created index {collection_name}.{name}")
+            except OperationFailure as e:
+                # e.g. duplicate emails blocking a unique index; keep serving without it
+                logging.error(f"Could not create index {collection_name}.{name}: {e}")
+    finally:
+        await db.maintenance_locks.delete_one({"_id": "ensure_indexes", "holder": holder})
+
+async def find_unindexed_queries():
+    """Return the API query shapes that no existing index can serve"""
+    leading_fields = {}
+    for collection_name in {collection for collection, _, _ in API_QUERIES}:
+        indexes = await db[collection_name].index_information()
+        leading_fields[collection_name] = {
+            list(index["key"])[0][0] for name, index in indexes.items() if name != "_id_"
+        }
+    return [
+        (collection, fields, source)
+        for collection, fields, source in API_QUERIES
+        if not leading_fields[collection].intersection(fields)
+    ]
+
+async def print_index_report():
+    unindexed = await find_unindexed_queries()
+    if not unindexed:
+        print("Every API query has a supporting index")
+        return
+    print(f"{len(unindexed)} API queries have no supporting index:")
+    for collection, fields, source in unindexed:
+        print(f"  {collection} on {', '.join(fields)}  ({source})")
+
 # ==================== EXISTING ROUTES ====================
 
 # ==================== HELPER FUNCTIONS ====================
 
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
-
-def get_password_hash(password):
-    return pwd_context.hash(password)
+PASSWORD_HASH_WORKERS = int(os.environ.get("PASSWORD_HASH_WORKERS", "4"))
+PASSWORD_HASH_QUEUE_LIMIT = int(os.environ.get("PASSWORD_HASH_QUEUE_LIMIT", "64"))  # Waiting calls before 503
+
+class PasswordHasher:
+    """Runs bcrypt on a dedicated thread pool so hashing never blocks the event loop.
+    At most `workers` calls run at once; beyond `queue_limit` waiting calls new
+    ones are turned away with 503 instead of piling up behind a login storm."""
+
+    def __init__(self, workers: int, queue_limit: int):
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self.executor: Optional[ThreadPoolExecutor] = None
+        self.slots = asyncio.Semaphore(workers)
+        self.waiting = 0
+        self.running = 0
+        self.stats = {"hashed": 0, "verified": 0, "rejected": 0, "wait_seconds": 0.0, "max_wait_seconds": 0.0}
+
+    async def hash(self, password: str) -> str:
+        return await self._run("hashed", pwd_context.hash, password)
+
+    async def verify(self, password: str, hashed_password: str) -> bool:
+        return await self._run("verified", pwd_context.verify, password, hashed_password)
+
+    async def _run(self, counter: str, fn, *args):
+        if self.waiting >= self.queue_limit:
+            self.stats["rejected"] += 1
+            raise HTTPException(status_code=503, detail="Server busy, please try again", headers={"Retry-After": "1"})
+        self.waiting += 1
+        queued_at = time.monotonic()
+        try:
+            await self.slots.acquire()
+        finally:
+            self.waiting -= 1
+        waited = time.monotonic() - queued_at
+        self.stats["wait_seconds"] += waited
+        self.stats["max_wait_seconds"] = max(self.stats["max_wait_seconds"], waited)
+        self.running += 1
+        self.stats[counter] += 1
+        try:
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="password-hash")
+            return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+        finally:
+            self.running -= 1
+            self.slots.release()
+
+    def metrics(self) -> dict:
+        return {"workers": self.workers, "waiting": self.waiting, "running": self.running, **self.stats}
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+password_hasher = PasswordHasher(PASSWORD_HASH_WORKERS, PASSWORD_HASH_QUEUE_LIMIT)
+
+async def verify_password(plain_password, hashed_password):
+    return await password_hasher.verify(plain_password, hashed_password)
+
+async def get_password_hash(password):
+    return await password_hasher.hash(password)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
@@ -298,26 +802,755 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
+PRINCIPAL_CACHE_SIZE = int(os.environ.get("PRINCIPAL_CACHE_SIZE", "10000"))
+PRINCIPAL_CACHE_TTL = float(os.environ.get("PRINCIPAL_CACHE_TTL", "60"))  # Seconds, bounds staleness across workers
+
+class PrincipalCache:
+    """User documents of authenticated callers by user id, least recently used
+    evicted first. Writes to a user call invalidate(); the TTL covers writes made
+    by other workers."""
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.users: "OrderedDict[str, tuple]" = OrderedDict()
+        self.stats = {"hits": 0, "misses": 0}
+
+    async def get(self, user_id: str) -> Optional[dict]:
+        entry = self.users.get(user_id)
+        if entry is not None and entry[0] > time.monotonic():
+            self.stats["hits"] += 1
+            self.users.move_to_end(user_id)
+            # Handlers get their own copy, so the cached document is never mutated
+            return dict(entry[1])
+        self.stats["misses"] += 1
+        user = await db.users.find_one({"id": user_id})
+        if user is None:
+            self.users.pop(user_id, None)
+            return None
+        self.users[user_id] = (time.monotonic() + self.ttl, user)
+        self.users.move_to_end(user_id)
+        if len(self.users) > self.max_size:
+            self.users.popitem(last=False)
+        return dict(user)
+
+    def invalidate(self, user_id: str):
+        self.users.pop(user_id, None)
+
+    def metrics(self) -> dict:
+        return {"size": len(self.users), **self.stats}
+
+principals = PrincipalCache(PRINCIPAL_CACHE_SIZE, PRINCIPAL_CACHE_TTL)
+
+async def authenticate_token(token: str) -> Optional[dict]:
+    """The user an access token belongs to, or None if the token is invalid or the user is gone"""
     try:
-        token = credentials.credentials
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id: str = payload.get("sub")
-        if user_id is None:
-            raise credentials_exception
     except JWTError:
-        raise credentials_exception
-    
-    user = await db.users.find_one({"id": user_id})
+        return None
+    user_id = payload.get("sub")
+    if user_id is None:
+        return None
+    return await principals.get(user_id)
+
+async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    user = await authenticate_token(credentials.credentials)
     if user is None:
-        raise credentials_exception
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
     return user
 
+async def get_active_user_ids(user_ids: List[str]) -> set:
+    """Return the subset of user_ids that exist and are not paused, in one query"""
+    if not user_ids:
+        return set()
+    users = db.users.find(
+        {"id": {"$in": list(set(user_ids))}, "is_paused": {"$ne": True}},
+        {"id": 1, "_id": 0}
+    )
+    return {user["id"] async for user in users}
+
+# ==================== PAGINATION ====================
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+# Messages of each room included by the admin chat listing
+ADMIN_TRANSCRIPT_LIMIT = 1000
+
+def encode_cursor(values: list) -> str:
+    """Encode the sort key of the last item on a page as an opaque cursor"""
+    payload = [{"$dt": value.isoformat()} if isinstance(value, datetime) else value for value in values]
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> list:
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return [datetime.fromisoformat(value["$dt"]) if isinstance(value, dict) else value for value in payload]
+    except (ValueError, TypeError, KeyError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def keyset_filter(sort: list, values: list) -> dict:
+    """Match documents that come strictly after `values` in the given sort order"""
+    branches = []
+    for position, (field, direction) in enumerate(sort):
+        branch = {prefix_field: prefix_value for (prefix_field, _), prefix_value in zip(sort[:position], values[:position])}
+        value = values[position]
+        if value is None:
+            if direction == DESCENDING:
+                continue  # nothing sorts below a missing value
+            branch[field] = {"$ne": None}
+        elif direction == ASCENDING:
+            branch[field] = {"$gt": value}
+        else:
+            # $not keeps documents missing the field, which sort last in descending order
+            branch[field] = {"$not": {"$gte": value}}
+        branches.append(branch)
+    return {"$or": branches}
+
+async def fetch_page(collection, query: dict, sort: list, limit: int, cursor: Optional[str] = None, projection: Optional[dict] = None):
+    """Fetch one keyset page; returns (documents, next_cursor). The last sort field must be unique."""
+    if cursor:
+        values = decode_cursor(cursor)
+        if len(values) != len(sort):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        query = {"$and": [query, keyset_filter(sort, values)]}
+    documents = await collection.find(query, projection).sort(sort).limit(limit + 1).to_list(limit + 1)
+    next_cursor = None
+    if len(documents) > limit:
+        documents = documents[:limit]
+        next_cursor = encode_cursor([documents[-1].get(field) for field, _ in sort])
+    return documents, next_cursor
+
+def set_next_cursor(response: Response, next_cursor: Optional[str]):
+    """Expose the cursor of the next page; list bodies stay plain arrays"""
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+
+# ==================== PROFILE CARDS ====================
+
+# Listing fields returned by list and enrichment queries. Inline media is never
+# loaded there; cards reference it by URL and the full profile comes from the
+# detail endpoints.
+ARTIST_CARD_FIELDS = [
+    "id", "user_id", "stage_name", "art_type", "description", "experience_gigs", "rating",
+    "review_count", "availability", "locations", "pricing", "is_featured", "featured_until",
+    "featured_type", "created_at"
+]
+PARTNER_CARD_FIELDS = [
+    "id", "user_id", "brand_name", "service_type", "description", "rating", "review_count",
+    "locations", "is_featured", "featured_until", "featured_type", "created_at"
+]
+VENUE_CARD_FIELDS = ["id", "user_id", "venue_name", "description", "created_at"]
+
+PROFILE_PATHS = {"artist": "artists", "partner": "partners", "venue": "venues"}
+
+def card_projection(fields: List[str]) -> dict:
+    projection = {field: 1 for field in fields}
+    projection["_id"] = 0
+    projection["has_profile_image"] = {"$gt": [{"$ifNull": ["$profile_image", None]}, None]}
+    projection["media_count"] = {"$size": {"$ifNull": ["$media_gallery", []]}}
+    # Media ids are short enough to ship with the card; inline base64 is not
+    projection["profile_image_ref"] = media_ref_expression("$profile_image")
+    projection["cover_image_ref"] = media_ref_expression({"$arrayElemAt": [{"$ifNull": ["$media_gallery", []]}, 0]})
+    return projection
+
+def media_ref_expression(value) -> dict:
+    """Aggregation expression yielding the value only when it looks like a media id"""
+    return {"$cond": [
+        {"$eq": [{"$type": value}, "string"]},
+        {"$cond": [{"$eq": [{"$strLenBytes": value}, 64]}, value, None]},
+        None
+    ]}
+
+ARTIST_CARD_PROJECTION = card_projection(ARTIST_CARD_FIELDS)
+PARTNER_CARD_PROJECTION = card_projection(PARTNER_CARD_FIELDS)
+VENUE_CARD_PROJECTION = card_projection(VENUE_CARD_FIELDS)
+
+def to_card(profile: dict, profile_type: str) -> dict:
+    """Replace the computed media flags of a card with media URLs"""
+    base_path = f"/api/{PROFILE_PATHS[profile_type]}/{profile['id']}"
+    has_profile_image = profile.pop("has_profile_image", False)
+    profile_image_ref = profile.pop("profile_image_ref", None)
+    cover_image_ref = profile.pop("cover_image_ref", None)
+    profile["profile_image_url"] = media_url(profile_image_ref, f"{base_path}/profile-image", "thumb") if has_profile_image else None
+    profile["cover_image_url"] = media_url(cover_image_ref, f"{base_path}/media/0", "preview") if profile.get("media_count") else None
+    return profile
+
+def media_url(value, fallback: str, variant: Optional[str] = None) -> str:
+    """Cacheable /api/media URL for a media id, or the per-profile fallback route for inline data"""
+    if not is_media_id(value):
+        return fallback
+    return f"/api/media/{value}/{variant}" if variant else f"/api/media/{value}"
+
+def sparse_projection(fields: Optional[str]) -> dict:
+    """Projection for the ?fields= sparse fieldset parameter of detail endpoints"""
+    if not fields:
+        return {"_id": 0}
+    names = [name.strip() for name in fields.split(",") if name.strip()]
+    if not all(name.replace("_", "").replace(".", "").isalnum() for name in names):
+        raise HTTPException(status_code=400, detail="Invalid fields parameter")
+    projection = {name: 1 for name in names}
+    projection["id"] = 1
+    projection["_id"] = 0
+    return projection
+
+def decode_inline_media(value: str) -> bytes:
+    """Bytes of a base64 data URI or bare base64 string. The declared type of a data
+    URI is ignored; the content type is always taken from the bytes themselves.
+    Raises ValueError for invalid base64."""
+    if value.startswith("data:"):
+        value = value.partition(",")[2]
+    return base64.b64decode(value)
+
+async def serve_profile_media(collection, profile_id: str, index: Optional[int] = None):
+    """Serve the profile image (index None) or one gallery item without loading the rest"""
+    if index is None:
+        projection = {"_id": 0, "profile_image": 1}
+    else:
+        projection = {"_id": 0, "media_gallery": {"$slice": [index, 1]}}
+    profile = await collection.find_one({"id": profile_id}, projection)
+    if not profile:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    value = profile.get("profile_image") if index is None else next(iter(profile.get("media_gallery") or []), None)
+    if not value:
+        raise HTTPException(status_code=404, detail="Media not found")
+    if is_media_id(value):
+        return RedirectResponse(f"/api/media/{value}", status_code=307, headers={"Cache-Control": "public, max-age=300"})
+    try:
+        data = decode_inline_media(value)
+    except ValueError:
+        raise HTTPException(status_code=404, detail="Media not found")
+    content_type = sniff_media_type(data) or "application/octet-stream"
+    return Response(content=data, media_type=content_type, headers={
+        "Cache-Control": "public, max-age=300", **media_safety_headers(content_type)
+    })
+
+async def with_media_urls(profile: dict, profile_type: str) -> dict:
+    """Add URLs for the media referenced by a full profile, and the kind ("image" or
+    "video") of every gallery item so clients know which player to use"""
+    base_path = f"/api/{PROFILE_PATHS[profile_type]}/{profile['id']}"
+    if "profile_image" in profile:
+        profile["profile_image_url"] = media_url(profile["profile_image"], f"{base_path}/profile-image") if profile["profile_image"] else None
+    if "media_gallery" in profile:
+        gallery = profile["media_gallery"] or []
+        profile["media_gallery_urls"] = [media_url(value, f"{base_path}/media/{index}") for index, value in enumerate(gallery)]
+        media_ids = [value for value in gallery if is_media_id(value)]
+        kinds = {}
+        if media_ids:
+            async for media in db.media.find({"id": {"$in": media_ids}}, {"_id": 0, "id": 1, "kind": 1}):
+                kinds[media["id"]] = media["kind"]
+        profile["media_gallery_kinds"] = [
+            kinds.get(value, "image") if is_media_id(value) else ("video" if str(value).startswith("data:video") else "image")
+            for value in gallery
+        ]
+    return profile
+
+# ==================== MEDIA STORAGE ====================
+
+# Profile media is stored once per distinct content; the media id is the sha256
+# hex digest of the bytes. Profiles only hold media ids in profile_image and
+# media_gallery, and the `media` collection keeps content type and size.
+MEDIA_BACKEND = os.environ.get("MEDIA_BACKEND", "filesystem")  # "filesystem" or "gridfs"
+MEDIA_ROOT = Path(os.environ.get("MEDIA_ROOT", ROOT_DIR / "media"))
+MEDIA_CHUNK_SIZE = 256 * 1024
+MEDIA_ID_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+MEDIA_SIZE_LIMITS = {"image": 10 * 1024 * 1024, "video": 200 * 1024 * 1024}
+# Media URLs are content-addressed, so a given URL never changes its bytes
+MEDIA_CACHE_CONTROL = "public, max-age=31536000, immutable"
+MEDIA_DERIVE_WORKERS = int(os.environ.get("MEDIA_DERIVE_WORKERS", "2"))
+
+def is_media_id(value) -> bool:
+    return isinstance(value, str) and bool(MEDIA_ID_PATTERN.match(value))
+
+def media_kind(content_type: str) -> str:
+    return content_type.split("/")[0] if content_type.split("/")[0] in ("image", "video") else "other"
+
+# Only raster images and videos are accepted, identified by their magic bytes rather
+# than by what the client declares: anything a browser could run as a document
+# (HTML, SVG, XML...) must never be stored and served from the API origin.
+MEDIA_CONTENT_TYPES = {
+    "image/jpeg", "image/png", "image/gif", "image/webp", "image/heic", "image/heif", "image/avif",
+    "video/mp4", "video/quicktime", "video/webm"
+}
+MEDIA_SNIFF_LENGTH = 16
+# ISO-BMFF files (MP4, QuickTime, HEIF, AVIF...) share the `ftyp` box; its major
+# brand tells stills from video. Other brands (audio, DRM, unknown) are rejected.
+FTYP_BRANDS = {
+    b"isom": "video/mp4", b"iso2": "video/mp4", b"iso4": "video/mp4", b"iso5": "video/mp4", b"iso6": "video/mp4",
+    b"mp41": "video/mp4", b"mp42": "video/mp4", b"mp4v": "video/mp4", b"avc1": "video/mp4", b"dash": "video/mp4",
+    b"M4V ": "video/mp4", b"M4VH": "video/mp4", b"M4VP": "video/mp4", b"MSNV": "video/mp4",
+    b"3gp4": "video/mp4", b"3gp5": "video/mp4", b"3gp6": "video/mp4",
+    b"qt  ": "video/quicktime",
+    b"heic": "image/heic", b"heix": "image/heic", b"hevc": "image/heic", b"hevx": "image/heic",
+    b"heim": "image/heic", b"heis": "image/heic",
+    b"mif1": "image/heif", b"msf1": "image/heif", b"heif": "image/heif",
+    b"avif": "image/avif", b"avis": "image/avif",
+}
+
+def sniff_media_type(head: bytes) -> Optional[str]:
+    """Content type of an allowed media format from the first bytes of a file, or None"""
+    if head.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if head.startswith((b"GIF87a", b"GIF89a")):
+        return "image/gif"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    if head[4:8] == b"ftyp":
+        return FTYP_BRANDS.get(head[8:12])
+    if head.startswith(b"\x1a\x45\xdf\xa3"):
+        return "video/webm"
+    return None
+
+def media_safety_headers(content_type: str) -> dict:
+    """Headers that stop browsers from sniffing or rendering served media as a document"""
+    headers = {"X-Content-Type-Options": "nosniff"}
+    if content_type not in MEDIA_CONTENT_TYPES:
+        headers["Content-Security-Policy"] = "sandbox"
+        headers["Content-Disposition"] = "attachment"
+    return headers
+
+class MediaUpload(ABC):
+    """A staged upload that hashes its content as it is written"""
+
+    def __init__(self):
+        self.hasher = hashlib.sha256()
+        self.size = 0
+
+    async def write(self, chunk: bytes):
+        self.hasher.update(chunk)
+        self.size += len(chunk)
+        await self._write(chunk)
+
+    async def commit(self) -> str:
+        """Finish the upload and return its media id; identical content is kept once"""
+        media_id = self.hasher.hexdigest()
+        await self._commit(media_id)
+        return media_id
+
+    @abstractmethod
+    async def _write(self, chunk: bytes):
+        ...
+
+    @abstractmethod
+    async def _commit(self, media_id: str):
+        ...
+
+    @abstractmethod
+    async def abort(self):
+        ...
+
+class MediaStore(ABC):
+    """Interface of the content-addressed blob store behind profile media"""
+
+    @abstractmethod
+    async def open_upload(self) -> MediaUpload:
+        ...
+
+    @abstractmethod
+    async def exists(self, media_id: str) -> bool:
+        ...
+
+    @abstractmethod
+    def read(self, media_id: str, start: int = 0, end: Optional[int] = None) -> AsyncIterator[bytes]:
+        """Yield the bytes of [start, end) in chunks"""
+
+    @abstractmethod
+    async def delete(self, media_id: str):
+        ...
+
+    def response(self, media_id: str, start: int, end: int, **kwargs) -> Response:
+        """Response streaming bytes [start, end) of a blob"""
+        return StreamingResponse(self.read(media_id, start, end), **kwargs)
+
+class FilesystemMediaUpload(MediaUpload):
+    def __init__(self, store: "FilesystemMediaStore"):
+        super().__init__()
+        self.store = store
+        self.staging_path = store.root / "tmp" / str(uuid.uuid4())
+        self.file = None
+
+    async def _write(self, chunk: bytes):
+        if self.file is None:
+            await aiofiles.os.makedirs(self.staging_path.parent, exist_ok=True)
+            self.file = await aiofiles.open(self.staging_path, "wb")
+        await self.file.write(chunk)
+
+    async def _commit(self, media_id: str):
+        await self._write(b"")
+        await self.file.close()
+        final_path = self.store.path(media_id)
+        if await aiofiles.os.path.exists(final_path):
+            await aiofiles.os.remove(self.staging_path)
+            return
+        await aiofiles.os.makedirs(final_path.parent, exist_ok=True)
+        await aiofiles.os.replace(self.staging_path, final_path)
+
+    async def abort(self):
+        if self.file is not None:
+            await self.file.close()
+            await aiofiles.os.remove(self.staging_path)
+
+class FilesystemMediaStore(MediaStore):
+    """Stores each blob at MEDIA_ROOT/<first two hex chars>/<media id>"""
+
+    def __init__(self, root: Path):
+        self.root = root
+
+    def path(self, media_id: str) -> Path:
+        return self.root / media_id[:2] / media_id
+
+    async def open_upload(self) -> MediaUpload:
+        return FilesystemMediaUpload(self)
+
+    async def exists(self, media_id: str) -> bool:
+        return await aiofiles.os.path.exists(self.path(media_id))
+
+    async def read(self, media_id: str, start: int = 0, end: Optional[int] = None):
+        async with aiofiles.open(self.path(media_id), "rb") as f:
+            await f.seek(start)
+            remaining = None if end is None else end - start
+            while remaining is None or remaining > 0:
+                chunk = await f.read(MEDIA_CHUNK_SIZE if remaining is None else min(MEDIA_CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                if remaining is not None:
+                    remaining -= len(chunk)
+                yield chunk
+
+    async def delete(self, media_id: str):
+        if await self.exists(media_id):
+            await aiofiles.os.remove(self.path(media_id))
+
+    def response(self, media_id: str, start: int, end: int, **kwargs) -> Response:
+        return MediaFileResponse(self.path(media_id), start, end, **kwargs)
+
+class MediaFileResponse(Response):
+    """Sends [start, end) of a file, handing the file to the server for zero-copy
+    sendfile when it supports the ASGI zerocopysend or pathsend extensions"""
+
+    def __init__(self, path: Path, start: int, end: int, status_code: int = 200,
+                 headers: Optional[dict] = None, media_type: Optional[str] = None):
+        self.path = path
+        self.start = start
+        self.end = end
+        self.status_code = status_code
+        self.media_type = media_type
+        self.background = None
+        self.init_headers(headers)
+
+    async def __call__(self, scope, receive, send):
+        extensions = scope.get("extensions") or {}
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if scope.get("method") == "HEAD":
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+        elif "http.response.zerocopysend" in extensions:
+            with open(self.path, "rb") as f:
+                await send({
+                    "type": "http.response.zerocopysend",
+                    "file": f.fileno(),
+                    "offset": self.start,
+                    "count": self.end - self.start,
+                    "more_body": False
+                })
+        elif "http.response.pathsend" in extensions and self.start == 0 and self.end == (await aiofiles.os.stat(self.path)).st_size:
+            await send({"type": "http.response.pathsend", "path": str(self.path)})
+        else:
+            async with aiofiles.open(self.path, "rb") as f:
+                await f.seek(self.start)
+                remaining = self.end - self.start
+                while remaining > 0:
+                    chunk = await f.read(min(MEDIA_CHUNK_SIZE, remaining))
+                    if not chunk:
+                        break
+                    remaining -= len(chunk)
+                    await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+                if remaining > 0:
+                    await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+class GridFSMediaUpload(MediaUpload):
+    def __init__(self, store: "GridFSMediaStore"):
+        super().__init__()
+        self.store = store
+        self.grid_in = store.bucket.open_upload_stream(f"staging-{uuid.uuid4()}")
+
+    async def _write(self, chunk: bytes):
+        await self.grid_in.write(chunk)
+
+    async def _commit(self, media_id: str):
+        await self.grid_in.close()
+        if await self.store.exists(media_id):
+            await self.store.bucket.delete(self.grid_in._id)
+        else:
+            await self.store.bucket.rename(self.grid_in._id, media_id)
+
+    async def abort(self):
+        await self.grid_in.abort()
+
+class GridFSMediaStore(MediaStore):
+    """Stores each blob as a GridFS file named after its media id"""
+
+    def __init__(self, database):
+        self.bucket = AsyncIOMotorGridFSBucket(database, bucket_name="media")
+        self.files = database["media.files"]
+
+    async def open_upload(self) -> MediaUpload:
+        return GridFSMediaUpload(self)
+
+    async def exists(self, media_id: str) -> bool:
+        return await self.files.find_one({"filename": media_id}, {"_id": 1}) is not None
+
+    async def read(self, media_id: str, start: int = 0, end: Optional[int] = None):
+        grid_out = await self.bucket.open_download_stream_by_name(media_id)
+        grid_out.seek(start)
+        remaining = (grid_out.length if end is None else end) - start
+        while remaining > 0:
+            chunk = await grid_out.read(min(MEDIA_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+    async def delete(self, media_id: str):
+        async for grid_file in self.files.find({"filename": media_id}, {"_id": 1}):
+            await self.bucket.delete(grid_file["_id"])
+
+def create_media_store() -> MediaStore:
+    if MEDIA_BACKEND == "gridfs":
+        return GridFSMediaStore(db)
+    return FilesystemMediaStore(MEDIA_ROOT)
+
+media_store = create_media_store()
+
+async def register_media(media_id: str, content_type: str, size: int, variant_of: Optional[str] = None):
+    """Record metadata for stored content; re-uploads of the same bytes are no-ops.
+    Original images get their variants derived in the background."""
+    document = {
+        "id": media_id,
+        "content_type": content_type,
+        "kind": media_kind(content_type),
+        "size": size,
+        "created_at": datetime.utcnow()
+    }
+    if variant_of:
+        document["variant_of"] = variant_of
+    await db.media.update_one({"id": media_id}, {"$setOnInsert": document}, upsert=True)
+    if document["kind"] == "image" and not variant_of:
+        schedule_media_variants(media_id)
+
+async def store_media_bytes(data: bytes, content_type: str, variant_of: Optional[str] = None) -> str:
+    upload = await media_store.open_upload()
+    try:
+        for offset in range(0, len(data), MEDIA_CHUNK_SIZE):
+            await upload.write(data[offset:offset + MEDIA_CHUNK_SIZE])
+        media_id = await upload.commit()
+    except Exception:
+        await upload.abort()
+        raise
+    await register_media(media_id, content_type, len(data), variant_of)
+    return media_id
+
+async def ingest_media_value(value):
+    """Move an inline base64 value into the media store and return its media id.
+    Media ids, URLs and empty values are returned unchanged."""
+    if not isinstance(value, str) or not value or is_media_id(value) or value.startswith(("http://", "https://")):
+        return value
+    try:
+        data = decode_inline_media(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid base64 media")
+    content_type = sniff_media_type(data[:MEDIA_SNIFF_LENGTH])
+    if content_type is None:
+        raise HTTPException(status_code=415, detail="Only JPEG, PNG, GIF, WebP, MP4, MOV and WebM media are supported")
+    return await store_media_bytes(data, content_type)
+
+async def ingest_profile_media(fields: dict) -> dict:
+    """Replace inline profile_image / media_gallery values in a profile dict with media ids"""
+    if fields.get("profile_image"):
+        fields["profile_image"] = await ingest_media_value(fields["profile_image"])
+    if fields.get("media_gallery"):
+        fields["media_gallery"] = [await ingest_media_value(value) for value in fields["media_gallery"]]
+    return fields
+
+async def migrate_inline_media():
+    """One-off migration: move base64 blobs embedded in profile documents into the media store
+    and derive the image variants of everything that was moved"""
+    inline = {"$type": "string", "$not": MEDIA_ID_PATTERN, "$nin": [""]}
+    query = {"$or": [
+        {"profile_image": inline},
+        {"media_gallery": {"$elemMatch": {"$type": "string", "$not": MEDIA_ID_PATTERN}}}
+    ]}
+    for collection in (db.artist_profiles, db.partner_profiles, db.venue_profiles):
+        migrated = 0
+        profiles = collection.find(query, {"_id": 0, "id": 1, "profile_image": 1, "media_gallery": 1}).batch_size(10)
+        async for profile in profiles:
+            try:
+                updates = await ingest_profile_media({
+                    key: profile[key] for key in ("profile_image", "media_gallery") if key in profile
+                })
+            except HTTPException as e:
+                # Left inline; serve_profile_media only serves it with safe headers
+                logging.warning(f"Inline media of {collection.name} {profile['id']} not migrated: {e.detail}")
+                continue
+            await collection.update_one({"id": profile["id"]}, {"$set": updates})
+            migrated += 1
+        logging.info(f"Migrated inline media of {migrated} {collection.name} documents")
+    await backfill_media_variants()
+
+# ==================== MEDIA VARIANTS ====================
+
+# Thumbnails and previews are rendered in worker processes (media_variants.py)
+# so that decoding large images never blocks the event loop. Variants are stored as ordinary
+# media and recorded under `variants` on the original's media document, which
+# makes derivation idempotent per content hash.
+_derivation_pool: Optional[ProcessPoolExecutor] = None
+_derivations: Dict[str, asyncio.Task] = {}
+# Bounds how many source images are held in memory waiting for a worker
+_derivation_slots = asyncio.Semaphore(MEDIA_DERIVE_WORKERS * 2)
+
+def get_derivation_pool() -> ProcessPoolExecutor:
+    global _derivation_pool
+    if _derivation_pool is None:
+        # By now the process runs the event loop, the Mongo client and executor
+        # threads, which fork() would copy in whatever state they are in. Workers
+        # come from a forkserver that only has the rendering module loaded.
+        context = multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload(["media_variants"])
+        _derivation_pool = ProcessPoolExecutor(max_workers=MEDIA_DERIVE_WORKERS, mp_context=context)
+    return _derivation_pool
+
+async def derive_media_variants(media_id: str):
+    """Render and store the variants of an original image unless it already has them"""
+    media = await db.media.find_one({"id": media_id}, {"_id": 0, "kind": 1, "variants": 1, "variant_of": 1})
+    if not media or media.get("kind") != "image" or media.get("variant_of"):
+        return
+    if set(MEDIA_VARIANTS) <= set(media.get("variants") or {}):
+        return
+    try:
+        async with _derivation_slots:
+            data = b"".join([chunk async for chunk in media_store.read(media_id)])
+            loop = asyncio.get_running_loop()
+            rendered = await loop.run_in_executor(get_derivation_pool(), render_image_variants, data)
+    except Exception as e:
+        # Undecodable images keep being served as-is
+        logging.warning(f"Could not derive variants of media {media_id}: {e}")
+        await db.media.update_one({"id": media_id}, {"$set": {"variants": {}, "variants_error": str(e)}})
+        return
+    variants = {}
+    for name, variant_data in rendered.items():
+        variants[name] = await store_media_bytes(variant_data, "image/webp", variant_of=media_id)
+    await db.media.update_one({"id": media_id}, {"$set": {"variants": variants}})
+
+def schedule_media_variants(media_id: str) -> asyncio.Task:
+    """Start deriving variants in the background; concurrent calls share one task"""
+    task = _derivations.get(media_id)
+    if task is None:
+        task = asyncio.create_task(derive_media_variants(media_id))
+        _derivations[media_id] = task
+        task.add_done_callback(lambda done: _derivations.pop(media_id, None))
+    return task
+
+async def backfill_media_variants():
+    """Derive missing variants for every stored original image"""
+    query = {"kind": "image", "variant_of": {"$exists": False}, "variants": {"$exists": False}}
+    media_ids = [media["id"] async for media in db.media.find(query, {"_id": 0, "id": 1})]
+    await asyncio.gather(*(schedule_media_variants(media_id) for media_id in media_ids), *_derivations.values())
+    logging.info(f"Derived variants for {len(media_ids)} images")
+
+def shutdown_derivation_pool():
+    global _derivation_pool
+    if _derivation_pool is not None:
+        _derivation_pool.shutdown(wait=False, cancel_futures=True)
+        _derivation_pool = None
+
+async def iter_multipart_file(request: Request):
+    """Yield (content_type, chunk) for the `file` part of a multipart body as it arrives"""
+    _, params = parse_options_header(request.headers.get("content-type"))
+    boundary = params.get(b"boundary")
+    if not boundary:
+        raise HTTPException(status_code=400, detail="Missing multipart boundary")
+
+    part = {"headers": {}, "field": b"", "value": b"", "is_file": False, "content_type": None}
+    pending = []
+    found = []
+
+    def on_part_begin():
+        part["headers"] = {}
+
+    def on_header_field(data, start, end):
+        part["field"] += data[start:end]
+
+    def on_header_value(data, start, end):
+        part["value"] += data[start:end]
+
+    def on_header_end():
+        part["headers"][part["field"].lower()] = part["value"]
+        part["field"] = part["value"] = b""
+
+    def on_headers_finished():
+        _, options = parse_options_header(part["headers"].get(b"content-disposition"))
+        part["is_file"] = options.get(b"name") == b"file" and not found
+        part["content_type"] = part["headers"].get(b"content-type", b"application/octet-stream").decode("latin-1")
+
+    def on_part_data(data, start, end):
+        if part["is_file"]:
+            pending.append(data[start:end])
+
+    def on_part_end():
+        if part["is_file"]:
+            found.append(True)
+            part["is_file"] = False
+
+    parser = MultipartParser(boundary, {
+        "on_part_begin": on_part_begin,
+        "on_part_data": on_part_data,
+        "on_part_end": on_part_end,
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+    })
+    async for chunk in request.stream():
+        parser.write(chunk)
+        for data in pending:
+            yield part["content_type"], data
+        pending.clear()
+    parser.finalize()
+
+def parse_range_header(range_header: Optional[str], size: int):
+    """(start, end) of a single `bytes=` range, or None to send the whole body.
+    Multi-range requests are answered with the whole body, which RFC 9110 allows."""
+    if not range_header or not range_header.startswith("bytes=") or "," in range_header:
+        return None
+    spec = range_header[6:].strip()
+    if not re.fullmatch(r"\d*-\d*", spec) or spec == "-":
+        return None
+    first, _, last = spec.partition("-")
+    if first:
+        start = int(first)
+        if last and int(last) < start:
+            # Syntactically invalid (last-pos before first-pos): ignored like any bad Range
+            return None
+        end = min(int(last) + 1, size) if last else size
+    else:
+        start, end = max(size - int(last), 0), size
+    if start >= size or start >= end:
+        raise HTTPException(
+            status_code=416,
+            detail="Requested range not satisfiable",
+            headers={"Content-Range": f"bytes */{size}"}
+        )
+    return start, end
+
+async def iter_raw_body(request: Request):
+    content_type = request.headers.get("content-type", "application/octet-stream")
+    async for chunk in request.stream():
+        yield content_type, chunk
+
 # ==================== AUTH ROUTES ====================
 
 @api_router.post("/auth/register", response_model=Token)
@@ -330,7 +1563,7 @@ async def register(user_data: UserRegister):
     # Create user
     user = User(
         email=user_data.email,
-        password_hash=get_password_hash(user_data.password),
+        password_hash=await get_password_hash(user_data.password),
         user_type=user_data.user_type
     )
     await db.users.insert_one(user.dict())
@@ -342,7 +1575,7 @@ async def register(user_data: UserRegister):
             stage_name=user_data.profile_data.get("stage_name", ""),
             description=user_data.profile_data.get("description", ""),
             art_type=user_data.profile_data.get("art_type", ""),
-            profile_image=user_data.profile_data.get("profile_image")
+            profile_image=await ingest_media_value(user_data.profile_data.get("profile_image"))
         )
         await db.artist_profiles.insert_one(profile.dict())
     elif user_data.user_type == "partner" and user_data.profile_data:
@@ -351,7 +1584,7 @@ async def register(user_data: UserRegister):
             brand_name=user_data.profile_data.get("brand_name", ""),
             description=user_data.profile_data.get("description", ""),
             service_type=user_data.profile_data.get("service_type", ""),
-            profile_image=user_data.profile_data.get("profile_image")
+            profile_image=await ingest_media_value(user_data.profile_data.get("profile_image"))
         )
         await db.partner_profiles.insert_one(profile.dict())
     elif user_data.user_type == "venue":
@@ -375,7 +1608,7 @@ async def register(user_data: UserRegister):
 @api_router.post("/auth/login", response_model=Token)
 async def login(credentials: UserLogin):
     user = await db.users.find_one({"email": credentials.email})
-    if not user or not verify_password(credentials.password, user["password_hash"]):
+    if not user or not await verify_password(credentials.password, user["password_hash"]):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password"
@@ -386,6 +1619,7 @@ async def login(credentials: UserLogin):
         {"id": user["id"]},
         {"$set": {"last_login": datetime.utcnow()}}
     )
+    principals.invalidate(user["id"])
     
     access_token = create_access_token(data={"sub": user["id"]})
     
@@ -409,6 +1643,7 @@ async def get_me(current_user: dict = Depends(get_current_user)):
     
     if profile:
         profile.pop("_id", None)
+        await with_media_urls(profile, current_user["user_type"])
     
     return {
         "user": {
@@ -419,10 +1654,119 @@ async def get_me(current_user: dict = Depends(get_current_user)):
         "profile": profile
     }
 
+# ==================== MEDIA ROUTES ====================
+
+@api_router.post("/media")
+async def upload_media(request: Request, current_user: dict = Depends(get_current_user)):
+    """Stream an image or video into the media store and return its media id.
+    Accepts a raw body or multipart/form-data with a `file` part. The content type
+    is detected from the leading bytes, so only formats in MEDIA_CONTENT_TYPES get
+    in whatever the client declares. Size limits are enforced while the body streams in."""
+    declared_size = int(request.headers.get("content-length") or 0)
+    if declared_size > max(MEDIA_SIZE_LIMITS.values()):
+        raise HTTPException(status_code=413, detail="Upload too large")
+
+    if request.headers.get("content-type", "").startswith("multipart/form-data"):
+        parts = iter_multipart_file(request)
+    else:
+        parts = iter_raw_body(request)
+
+    upload = await media_store.open_upload()
+    content_type = None
+    size_limit = 0
+    head = b""
+
+    async def write(chunk: bytes):
+        nonlocal content_type, size_limit
+        if content_type is None:
+            content_type = sniff_media_type(chunk)
+            if content_type is None:
+                raise HTTPException(status_code=415, detail="Only JPEG, PNG, GIF, WebP, MP4, MOV and WebM uploads are supported")
+            size_limit = MEDIA_SIZE_LIMITS[media_kind(content_type)]
+        if upload.size + len(chunk) > size_limit:
+            raise HTTPException(
+                status_code=413,
+                detail=f"{media_kind(content_type).capitalize()} uploads are limited to {size_limit // (1024 * 1024)} MB"
+            )
+        await upload.write(chunk)
+
+    try:
+        async for _, chunk in parts:
+            if content_type is None:
+                # Hold back the first bytes until there are enough to identify the format
+                head += chunk
+                if len(head) >= MEDIA_SNIFF_LENGTH:
+                    await write(head)
+            elif chunk:
+                await write(chunk)
+        if content_type is None:
+            if not head:
+                raise HTTPException(status_code=400, detail="No media in request body")
+            await write(head)
+        media_id = await upload.commit()
+    except BaseException:
+        await upload.abort()
+        raise
+
+    await register_media(media_id, content_type, upload.size)
+    return {"id": media_id, "content_type": content_type, "size": upload.size}
+
+@api_router.api_route("/media/{media_id}", methods=["GET", "HEAD"])
+async def get_media(media_id: str, request: Request):
+    """Serve stored media with a strong ETag (the content hash) and byte-range support"""
+    if not is_media_id(media_id):
+        raise HTTPException(status_code=404, detail="Media not found")
+    media = await db.media.find_one({"id": media_id}, {"_id": 0, "id": 1, "content_type": 1, "size": 1})
+    if not media:
+        raise HTTPException(status_code=404, detail="Media not found")
+    return serve_media(media, request, MEDIA_CACHE_CONTROL)
+
+@api_router.api_route("/media/{media_id}/{variant}", methods=["GET", "HEAD"])
+async def get_media_variant(media_id: str, variant: str, request: Request):
+    """Serve a derived variant, or the original while the variant is still being rendered"""
+    if not is_media_id(media_id) or variant not in MEDIA_VARIANTS:
+        raise HTTPException(status_code=404, detail="Media not found")
+    media = await db.media.find_one({"id": media_id}, {"_id": 0, "id": 1, "content_type": 1, "size": 1, "variants": 1})
+    if not media:
+        raise HTTPException(status_code=404, detail="Media not found")
+    variant_id = (media.get("variants") or {}).get(variant)
+    if variant_id:
+        variant_media = await db.media.find_one({"id": variant_id}, {"_id": 0, "id": 1, "content_type": 1, "size": 1})
+        if variant_media:
+            return serve_media(variant_media, request, MEDIA_CACHE_CONTROL)
+    if "variants" not in media and media_kind(media["content_type"]) == "image":
+        schedule_media_variants(media_id)
+        # The variant will replace this response shortly, so it must not be cached for long
+        return serve_media(media, request, "public, max-age=60")
+    return serve_media(media, request, MEDIA_CACHE_CONTROL)
+
+def serve_media(media: dict, request: Request, cache_control: str) -> Response:
+    media_id = media["id"]
+    etag = f'"{media_id}"'
+    headers = {"ETag": etag, "Cache-Control": cache_control, "Accept-Ranges": "bytes", **media_safety_headers(media["content_type"])}
+    if_none_match = request.headers.get("if-none-match", "")
+    if if_none_match.strip() == "*" or etag in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+
+    size = media["size"]
+    byte_range = None
+    if_range = request.headers.get("if-range")
+    if if_range is None or if_range.strip() == etag:
+        byte_range = parse_range_header(request.headers.get("range"), size)
+    if byte_range is None:
+        start, end, status_code = 0, size, 200
+    else:
+        start, end = byte_range
+        status_code = 206
+        headers["Content-Range"] = f"bytes {start}-{end - 1}/{size}"
+    headers["Content-Length"] = str(end - start)
+    return media_store.response(media_id, start, end, status_code=status_code, headers=headers, media_type=media["content_type"])
+
 # ==================== PROFILE ROUTES ====================
 
 @api_router.get("/artists")
 async def get_artists(
+    response: Response,
     min_rating: Optional[float] = None,
     max_rating: Optional[float] = None,
     min_experience: Optional[int] = None,
@@ -430,9 +1774,14 @@ async def get_artists(
     min_price: Optional[float] = None,
     max_price: Optional[float] = None,
     location: Optional[str] = None,
-    available_only: Optional[bool] = False
+    available_only: Optional[bool] = False,
+    featured_only: Optional[bool] = False,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE)
 ):
     query = {"is_paused": {"$ne": True}}  # Exclude paused profiles
+    if featured_only:
+        query["is_featured"] = True
     
     # Rating filter
     if min_rating is not None or max_rating is not None:
@@ -457,43 +1806,43 @@ async def get_artists(
     # Availability filter
     if available_only:
         query["availability"] = {"$exists": True, "$ne": []}
-    
-    artists = await db.artist_profiles.find(query).to_list(1000)
-    
-    # Filter out paused profiles
-    filtered_artists = []
-    for artist in artists:
-        user = await db.users.find_one({"id": artist["user_id"]})
-        if user and not user.get("is_paused", False):
-            filtered_artists.append(artist)
-    
-    artists = filtered_artists
-    
-    # Price filter (done after fetch since it's nested)
+
+    # Price filter - artists working for promotion match any price range
     if min_price is not None or max_price is not None:
-        filtered_artists = []
-        for artist in artists:
-            if artist.get("pricing"):
-                price = artist["pricing"].get("price_per_hour")
-                if price is not None:
-                    if (min_price is None or price >= min_price) and (max_price is None or price <= max_price):
-                        filtered_artists.append(artist)
-                elif artist["pricing"].get("is_for_promotion"):
-                    # Include artists working for promotion in any price range
-                    filtered_artists.append(artist)
-        artists = filtered_artists
-    
-    for artist in artists:
-        artist.pop("_id", None)
-    return artists
+        price_range = {}
+        if min_price is not None:
+            price_range["$gte"] = min_price
+        if max_price is not None:
+            price_range["$lte"] = max_price
+        query["$or"] = [
+            {"pricing.price_per_hour": price_range},
+            {"pricing.price_per_hour": None, "pricing.is_for_promotion": True}
+        ]
+
+    artists, next_cursor = await fetch_page(
+        db.artist_profiles, query, [("rating", DESCENDING), ("id", ASCENDING)], limit, cursor,
+        projection=ARTIST_CARD_PROJECTION
+    )
+    set_next_cursor(response, next_cursor)
+
+    # Filter out profiles whose user account is paused (one batched lookup)
+    active_user_ids = await get_active_user_ids([artist["user_id"] for artist in artists])
+    return [to_card(artist, "artist") for artist in artists if artist["user_id"] in active_user_ids]
 
 @api_router.get("/artists/{artist_id}")
-async def get_artist(artist_id: str):
-    artist = await db.artist_profiles.find_one({"id": artist_id})
+async def get_artist(artist_id: str, fields: Optional[str] = None):
+    artist = await db.artist_profiles.find_one({"id": artist_id}, sparse_projection(fields))
     if not artist:
         raise HTTPException(status_code=404, detail="Artist not found")
-    artist.pop("_id", None)
-    return artist
+    return await with_media_urls(artist, "artist")
+
+@api_router.get("/artists/{artist_id}/profile-image")
+async def get_artist_profile_image(artist_id: str):
+    return await serve_profile_media(db.artist_profiles, artist_id)
+
+@api_router.get("/artists/{artist_id}/media/{index}")
+async def get_artist_media(artist_id: str, index: int):
+    return await serve_profile_media(db.artist_profiles, artist_id, index)
 
 @api_router.post("/artists")
 async def create_artist(artist_data: dict, current_user: dict = Depends(get_current_user)):
@@ -502,7 +1851,7 @@ async def create_artist(artist_data: dict, current_user: dict = Depends(get_curr
         raise HTTPException(status_code=403, detail="Only artists can create artist profiles")
     
     # Check if artist profile already exists
-    existing = await db.artist_profiles.find_one({"user_id": current_user["id"]})
+    existing = await db.artist_profiles.find_one({"user_id": current_user["id"]}, {"_id": 1})
     if existing:
         raise HTTPException(status_code=400, detail="Artist profile already exists")
     
@@ -516,7 +1865,7 @@ async def create_artist(artist_data: dict, current_user: dict = Depends(get_curr
         "experience_gigs": artist_data.get("experience_gigs", 0),
         "availability": artist_data.get("availability", []),
         "locations": artist_data.get("locations", []),
-        "media_gallery": artist_data.get("media_gallery", []),
+        "media_gallery": [await ingest_media_value(value) for value in artist_data.get("media_gallery", [])],
         "rating": 0,
         "review_count": 0,
         "is_featured": False,
@@ -530,32 +1879,49 @@ async def create_artist(artist_data: dict, current_user: dict = Depends(get_curr
 
 @api_router.put("/artists/{artist_id}")
 async def update_artist(artist_id: str, updates: dict, current_user: dict = Depends(get_current_user)):
-    artist = await db.artist_profiles.find_one({"id": artist_id})
+    artist = await db.artist_profiles.find_one({"id": artist_id}, {"_id": 0, "user_id": 1})
     if not artist:
         raise HTTPException(status_code=404, detail="Artist not found")
     
     if artist["user_id"] != current_user["id"] and current_user["user_type"] != "admin":
         raise HTTPException(status_code=403, detail="Not authorized")
     
-    await db.artist_profiles.update_one({"id": artist_id}, {"$set": updates})
+    await db.artist_profiles.update_one({"id": artist_id}, {"$set": await ingest_profile_media(updates)})
     updated_artist = await db.artist_profiles.find_one({"id": artist_id})
     updated_artist.pop("_id", None)
-    return updated_artist
+    return await with_media_urls(updated_artist, "artist")
 
 @api_router.get("/partners")
-async def get_partners():
-    partners = await db.partner_profiles.find({"is_paused": {"$ne": True}}).to_list(1000)
-    for partner in partners:
-        partner.pop("_id", None)
-    return partners
+async def get_partners(
+    response: Response,
+    featured_only: Optional[bool] = False,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE)
+):
+    query = {"is_paused": {"$ne": True}}
+    if featured_only:
+        query["is_featured"] = True
+    partners, next_cursor = await fetch_page(
+        db.partner_profiles, query, [("rating", DESCENDING), ("id", ASCENDING)], limit, cursor,
+        projection=PARTNER_CARD_PROJECTION
+    )
+    set_next_cursor(response, next_cursor)
+    return [to_card(partner, "partner") for partner in partners]
 
 @api_router.get("/partners/{partner_id}")
-async def get_partner(partner_id: str):
-    partner = await db.partner_profiles.find_one({"id": partner_id})
+async def get_partner(partner_id: str, fields: Optional[str] = None):
+    partner = await db.partner_profiles.find_one({"id": partner_id}, sparse_projection(fields))
     if not partner:
         raise HTTPException(status_code=404, detail="Partner not found")
-    partner.pop("_id", None)
-    return partner
+    return await with_media_urls(partner, "partner")
+
+@api_router.get("/partners/{partner_id}/profile-image")
+async def get_partner_profile_image(partner_id: str):
+    return await serve_profile_media(db.partner_profiles, partner_id)
+
+@api_router.get("/partners/{partner_id}/media/{index}")
+async def get_partner_media(partner_id: str, index: int):
+    return await serve_profile_media(db.partner_profiles, partner_id, index)
 
 @api_router.post("/partners")
 async def create_partner(partner_data: dict, current_user: dict = Depends(get_current_user)):
@@ -564,7 +1930,7 @@ async def create_partner(partner_data: dict, current_user: dict = Depends(get_cu
         raise HTTPException(status_code=403, detail="Only partners can create partner profiles")
     
     # Check if partner profile already exists
-    existing = await db.partner_profiles.find_one({"user_id": current_user["id"]})
+    existing = await db.partner_profiles.find_one({"user_id": current_user["id"]}, {"_id": 1})
     if existing:
         raise HTTPException(status_code=400, detail="Partner profile already exists")
     
@@ -576,7 +1942,7 @@ async def create_partner(partner_data: dict, current_user: dict = Depends(get_cu
         "service_type": partner_data.get("service_type", "General"),
         "description": partner_data.get("description", ""),
         "locations": partner_data.get("locations", []),
-        "media_gallery": partner_data.get("media_gallery", []),
+        "media_gallery": [await ingest_media_value(value) for value in partner_data.get("media_gallery", [])],
         "rating": 0,
         "review_count": 0,
         "is_featured": False,
@@ -589,28 +1955,32 @@ async def create_partner(partner_data: dict, current_user: dict = Depends(get_cu
 
 @api_router.put("/partners/{partner_id}")
 async def update_partner(partner_id: str, updates: dict, current_user: dict = Depends(get_current_user)):
-    partner = await db.partner_profiles.find_one({"id": partner_id})
+    partner = await db.partner_profiles.find_one({"id": partner_id}, {"_id": 0, "user_id": 1})
     if not partner:
         raise HTTPException(status_code=404, detail="Partner not found")
     
     if partner["user_id"] != current_user["id"] and current_user["user_type"] != "admin":
         raise HTTPException(status_code=403, detail="Not authorized")
     
-    await db.partner_profiles.update_one({"id": partner_id}, {"$set": updates})
+    await db.partner_profiles.update_one({"id": partner_id}, {"$set": await ingest_profile_media(updates)})
     updated_partner = await db.partner_profiles.find_one({"id": partner_id})
     updated_partner.pop("_id", None)
-    return updated_partner
+    return await with_media_urls(updated_partner, "partner")
+
+@api_router.get("/venues/{venue_id}/profile-image")
+async def get_venue_profile_image(venue_id: str):
+    return await serve_profile_media(db.venue_profiles, venue_id)
 
 @api_router.put("/venues/{venue_id}")
 async def update_venue(venue_id: str, updates: dict, current_user: dict = Depends(get_current_user)):
-    venue = await db.venue_profiles.find_one({"id": venue_id})
+    venue = await db.venue_profiles.find_one({"id": venue_id}, {"_id": 0, "user_id": 1})
     if not venue:
         raise HTTPException(status_code=404, detail="Venue not found")
     
     if venue["user_id"] != current_user["id"]:
         raise HTTPException(status_code=403, detail="Not authorized")
     
-    await db.venue_profiles.update_one({"id": venue_id}, {"$set": updates})
+    await db.venue_profiles.update_one({"id": venue_id}, {"$set": await ingest_profile_media(updates)})
     updated_venue = await db.venue_profiles.find_one({"id": venue_id})
     updated_venue.pop("_id", None)
     return updated_venue
@@ -632,11 +2002,12 @@ async def pause_profile(current_user: dict = Depends(get_current_user)):
     else:
         raise HTTPException(status_code=400, detail="Invalid user type")
     
-    profile = await collection.find_one({"user_id": user_id})
+    profile = await collection.find_one({"user_id": user_id}, {"_id": 1})
     if not profile:
         raise HTTPException(status_code=404, detail="Profile not found")
     
     await collection.update_one({"user_id": user_id}, {"$set": {"is_paused": True}})
+    principals.invalidate(user_id)
     return {"message": "Profile paused successfully"}
 
 @api_router.post("/profile/unpause")
@@ -654,11 +2025,12 @@ async def unpause_profile(current_user: dict = Depends(get_current_user)):
     else:
         raise HTTPException(status_code=400, detail="Invalid user type")
     
-    profile = await collection.find_one({"user_id": user_id})
+    profile = await collection.find_one({"user_id": user_id}, {"_id": 1})
     if not profile:
         raise HTTPException(status_code=404, detail="Profile not found")
     
     await collection.update_one({"user_id": user_id}, {"$set": {"is_paused": False}})
+    principals.invalidate(user_id)
     return {"message": "Profile unpaused successfully"}
 
 @api_router.delete("/profile")
@@ -677,6 +2049,7 @@ async def delete_profile(current_user: dict = Depends(get_current_user)):
     
     # Delete user account
     await db.users.delete_one({"id": user_id})
+    principals.invalidate(user_id)
     
     # Delete related data
     await db.wishlist.delete_many({"venue_user_id": user_id})
@@ -707,7 +2080,7 @@ async def create_review(review: Review, current_user: dict = Depends(get_current
     
     # Update profile rating
     collection = db.artist_profiles if review.profile_type == "artist" else db.partner_profiles
-    profile = await collection.find_one({"id": review.profile_id})
+    profile = await collection.find_one({"id": review.profile_id}, {"_id": 0, "rating": 1, "review_count": 1})
     
     if profile:
         new_review_count = profile.get("review_count", 0) + 1
@@ -722,8 +2095,16 @@ async def create_review(review: Review, current_user: dict = Depends(get_current
     return {"message": "Review created successfully"}
 
 @api_router.get("/reviews/{profile_id}")
-async def get_reviews(profile_id: str):
-    reviews = await db.reviews.find({"profile_id": profile_id}).to_list(1000)
+async def get_reviews(
+    profile_id: str,
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE)
+):
+    reviews, next_cursor = await fetch_page(
+        db.reviews, {"profile_id": profile_id}, [("created_at", DESCENDING), ("id", DESCENDING)], limit, cursor
+    )
+    set_next_cursor(response, next_cursor)
     for review in reviews:
         review.pop("_id", None)
     return reviews
@@ -757,23 +2138,43 @@ async def remove_from_wishlist(profile_id: str, current_user: dict = Depends(get
         raise HTTPException(status_code=404, detail="Not found in wishlist")
     return {"message": "Removed from wishlist"}
 
+@api_router.get("/wishlist/{profile_id}")
+async def get_wishlist_entry(profile_id: str, current_user: dict = Depends(get_current_user)):
+    """Whether a profile is on the current venue's wishlist"""
+    entry = await db.wishlists.find_one({"venue_user_id": current_user["id"], "profile_id": profile_id}, {"_id": 1})
+    return {"in_wishlist": entry is not None}
+
 @api_router.get("/wishlist")
-async def get_wishlist(current_user: dict = Depends(get_current_user)):
+async def get_wishlist(
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    current_user: dict = Depends(get_current_user)
+):
     if current_user["user_type"] != "venue":
         raise HTTPException(status_code=403, detail="Only venues have wishlist")
     
-    wishlists = await db.wishlists.find({"venue_user_id": current_user["id"]}).to_list(1000)
-    
-    # Get full profiles
+    wishlists, next_cursor = await fetch_page(
+        db.wishlists, {"venue_user_id": current_user["id"]}, [("created_at", DESCENDING), ("id", DESCENDING)], limit, cursor
+    )
+    set_next_cursor(response, next_cursor)
+    
+    # Get profile cards, one query per profile collection
+    artist_ids = [item["profile_id"] for item in wishlists if item["profile_type"] == "artist"]
+    partner_ids = [item["profile_id"] for item in wishlists if item["profile_type"] != "artist"]
+    profiles = {}
+    if artist_ids:
+        async for profile in db.artist_profiles.find({"id": {"$in": artist_ids}}, ARTIST_CARD_PROJECTION):
+            profiles[("artist", profile["id"])] = to_card(profile, "artist")
+    if partner_ids:
+        async for profile in db.partner_profiles.find({"id": {"$in": partner_ids}}, PARTNER_CARD_PROJECTION):
+            profiles[("partner", profile["id"])] = to_card(profile, "partner")
+
     result = []
     for item in wishlists:
-        if item["profile_type"] == "artist":
-            profile = await db.artist_profiles.find_one({"id": item["profile_id"]})
-        else:
-            profile = await db.partner_profiles.find_one({"id": item["profile_id"]})
-        
+        profile_type = "artist" if item["profile_type"] == "artist" else "partner"
+        profile = profiles.get((profile_type, item["profile_id"]))
         if profile:
-            profile.pop("_id", None)
             result.append({
                 "wishlist_id": item["id"],
                 "profile": profile,
@@ -897,135 +2298,747 @@ async def create_chat_room(data: dict, current_user: dict = Depends(get_current_
     
     raise HTTPException(status_code=403, detail="Invalid chat request")
 
-@api_router.get("/chat/rooms")
-async def get_chat_rooms(current_user: dict = Depends(get_current_user)):
-    if current_user["user_type"] == "venue":
-        rooms = await db.chat_rooms.find({"venue_user_id": current_user["id"]}).to_list(1000)
-    elif current_user["user_type"] == "artist":
-        # Get venue chats, artist-to-artist chats, AND cross-type chats
-        rooms = await db.chat_rooms.find({
-            "$or": [
-                {"provider_user_id": current_user["id"]},  # Venue chats as provider
-                {"participant1_id": current_user["id"]},   # Artist-to-artist chats
-                {"participant2_id": current_user["id"]},   # Artist-to-artist chats
-                {"venue_user_id": current_user["id"]}      # Cross-type chats (artist as initiator)
-            ]
-        }).to_list(1000)
-    elif current_user["user_type"] == "partner":
-        # Get venue chats, partner-to-partner chats, AND cross-type chats
-        rooms = await db.chat_rooms.find({
-            "$or": [
-                {"provider_user_id": current_user["id"]},  # Venue/cross-type chats as provider
-                {"participant1_id": current_user["id"]},   # Partner-to-partner chats
-                {"participant2_id": current_user["id"]},   # Partner-to-partner chats
-                {"venue_user_id": current_user["id"]}      # Cross-type chats (partner as initiator)
-            ]
-        }).to_list(1000)
-    else:
-        rooms = []
-    
-    # Enrich with profile data
+async def enrich_chat_rooms(rooms: List[dict]):
+    """Attach participant profile cards and the last message to chat rooms.
+    Runs one query per profile collection, one for initiator users and one
+    aggregation for last messages, however many rooms there are."""
+    artist_user_ids, partner_user_ids, initiator_user_ids = set(), set(), set()
     for room in rooms:
         room.pop("_id", None)
-        
-        # Artist-to-artist chat
         if room.get("chat_type") == "artist_artist":
-            # Get both artist profiles
-            artist1_profile = await db.artist_profiles.find_one({"user_id": room["participant1_id"]})
-            artist2_profile = await db.artist_profiles.find_one({"user_id": room["participant2_id"]})
-            
-            if artist1_profile:
-                artist1_profile.pop("_id", None)
-                room["artist1_profile"] = artist1_profile
-            if artist2_profile:
-                artist2_profile.pop("_id", None)
-                room["artist2_profile"] = artist2_profile
-        # Partner-to-partner chat
+            artist_user_ids.update([room["participant1_id"], room["participant2_id"]])
         elif room.get("chat_type") == "partner_partner":
-            # Get both partner profiles
-            partner1_profile = await db.partner_profiles.find_one({"user_id": room["participant1_id"]})
-            partner2_profile = await db.partner_profiles.find_one({"user_id": room["participant2_id"]})
-            
-            if partner1_profile:
-                partner1_profile.pop("_id", None)
-                room["partner1_profile"] = partner1_profile
-            if partner2_profile:
-                partner2_profile.pop("_id", None)
-                room["partner2_profile"] = partner2_profile
+            partner_user_ids.update([room["participant1_id"], room["participant2_id"]])
+        else:
+            if room.get("venue_user_id"):
+                initiator_user_ids.add(room["venue_user_id"])
+            if room.get("provider_user_id"):
+                provider_ids = artist_user_ids if room.get("provider_type") == "artist" else partner_user_ids
+                provider_ids.add(room["provider_user_id"])
+
+    # Venue chat or cross-type chat: the initiator is a venue, artist or partner
+    user_types = {}
+    if initiator_user_ids:
+        async for user in db.users.find({"id": {"$in": list(initiator_user_ids)}}, {"_id": 0, "id": 1, "user_type": 1}):
+            user_types[user["id"]] = user["user_type"]
+    venue_user_ids = {user_id for user_id, user_type in user_types.items() if user_type == "venue"}
+    artist_user_ids.update(user_id for user_id, user_type in user_types.items() if user_type == "artist")
+    partner_user_ids.update(user_id for user_id, user_type in user_types.items() if user_type not in ("venue", "artist"))
+
+    cards = {"artist": {}, "partner": {}, "venue": {}}
+    for profile_type, collection, projection, user_ids in (
+        ("artist", db.artist_profiles, ARTIST_CARD_PROJECTION, artist_user_ids),
+        ("partner", db.partner_profiles, PARTNER_CARD_PROJECTION, partner_user_ids),
+        ("venue", db.venue_profiles, VENUE_CARD_PROJECTION, venue_user_ids),
+    ):
+        if user_ids:
+            async for profile in collection.find({"user_id": {"$in": list(user_ids)}}, projection):
+                cards[profile_type].setdefault(profile["user_id"], to_card(profile, profile_type))
+
+    # Rooms carry a last-message snapshot; only rooms not yet backfilled need the messages lookup
+    last_messages = await find_last_messages([
+        room["id"] for room in rooms if not room.get("last_message") and room.get("last_message_at")
+    ])
+
+    for room in rooms:
+        if room.get("chat_type") == "artist_artist":
+            for key, user_id in (("artist1_profile", room["participant1_id"]), ("artist2_profile", room["participant2_id"])):
+                if user_id in cards["artist"]:
+                    room[key] = dict(cards["artist"][user_id])
+        elif room.get("chat_type") == "partner_partner":
+            for key, user_id in (("partner1_profile", room["participant1_id"]), ("partner2_profile", room["participant2_id"])):
+                if user_id in cards["partner"]:
+                    room[key] = dict(cards["partner"][user_id])
         else:
-            # Venue chat or cross-type chat (existing logic)
-            # Get venue/initiator user
             venue_user_id = room.get("venue_user_id")
-            if venue_user_id:
-                venue_user = await db.users.find_one({"id": venue_user_id})
-                if venue_user and venue_user["user_type"] == "venue":
-                    venue_profile = await db.venue_profiles.find_one({"user_id": venue_user_id})
-                    if venue_profile:
-                        venue_profile.pop("_id", None)
-                        room["venue_profile"] = venue_profile
-                else:
-                    # Initiator is artist or partner (cross-type chat)
-                    if venue_user["user_type"] == "artist":
-                        initiator_profile = await db.artist_profiles.find_one({"user_id": venue_user_id})
-                    else:
-                        initiator_profile = await db.partner_profiles.find_one({"user_id": venue_user_id})
-                    if initiator_profile:
-                        initiator_profile.pop("_id", None)
-                        room["initiator_profile"] = initiator_profile
-            
-            # Get provider profile
-            if room.get("provider_type") == "artist":
-                provider_profile = await db.artist_profiles.find_one({"user_id": room.get("provider_user_id")})
+            initiator_type = user_types.get(venue_user_id)
+            if initiator_type == "venue":
+                if venue_user_id in cards["venue"]:
+                    room["venue_profile"] = dict(cards["venue"][venue_user_id])
+            elif initiator_type:
+                initiator_cards = cards["artist" if initiator_type == "artist" else "partner"]
+                if venue_user_id in initiator_cards:
+                    room["initiator_profile"] = dict(initiator_cards[venue_user_id])
+            provider_cards = cards["artist" if room.get("provider_type") == "artist" else "partner"]
+            if room.get("provider_user_id") in provider_cards:
+                room["provider_profile"] = dict(provider_cards[room["provider_user_id"]])
+
+        if room["id"] in last_messages:
+            room["last_message"] = last_messages[room["id"]]
+    return rooms
+
+LAST_MESSAGE_PREVIEW_LENGTH = 140
+
+def last_message_snapshot(message: dict) -> dict:
+    """Compact copy of a message for the chat list; `message` holds a truncated preview"""
+    text = message["message"] or ""
+    if len(text) > LAST_MESSAGE_PREVIEW_LENGTH:
+        text = text[:LAST_MESSAGE_PREVIEW_LENGTH - 1] + "\u2026"
+    return {
+        "id": message["id"],
+        "chat_room_id": message["chat_room_id"],
+        "sender_id": message["sender_id"],
+        "message": text,
+        "created_at": message["created_at"]
+    }
+
+def room_participant_ids(room: dict) -> List[str]:
+    if room.get("chat_type") in ["artist_artist", "partner_partner"]:
+        user_ids = [room.get("participant1_id"), room.get("participant2_id")]
+    else:
+        user_ids = [room.get("venue_user_id"), room.get("provider_user_id")]
+    return [user_id for user_id in user_ids if user_id]
+
+ROOM_PARTICIPANT_PROJECTION = {
+    "_id": 0, "chat_type": 1, "participant1_id": 1, "participant2_id": 1, "venue_user_id": 1, "provider_user_id": 1
+}
+ROOM_PARTICIPANT_FIELDS = ["participant1_id", "participant2_id", "venue_user_id", "provider_user_id"]
+
+ROOM_MEMBERSHIP_CACHE_SIZE = int(os.environ.get("ROOM_MEMBERSHIP_CACHE_SIZE", "10000"))
+# Seconds; bounds how long a deleted room stays authorized on a worker that missed
+# the invalidation (no pub/sub between workers, or the capped collection wrapped)
+ROOM_MEMBERSHIP_CACHE_TTL = float(os.environ.get("ROOM_MEMBERSHIP_CACHE_TTL", "300"))
+
+class RoomMembershipCache:
+    """room_id -> frozenset of the user ids allowed in the room, loaded on first use.
+    Participants never change after a room is created, so entries only go away when
+    the room is deleted, expire, or are evicted (least recently used first).
+    Deletions are published to the other workers with SOCKETIO_PUBSUB=mongo;
+    otherwise other workers keep a deleted room for at most the TTL."""
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.members: "OrderedDict[str, tuple]" = OrderedDict()
+        self.stats = {"hits": 0, "misses": 0}
+
+    async def get(self, room_id: str) -> Optional[frozenset]:
+        """Members of the room, or None if the room does not exist"""
+        entry = self.members.get(room_id)
+        if entry is not None and entry[0] > time.monotonic():
+            self.stats["hits"] += 1
+            self.members.move_to_end(room_id)
+            return entry[1]
+        self.stats["misses"] += 1
+        room = await db.chat_rooms.find_one({"id": room_id}, ROOM_PARTICIPANT_PROJECTION)
+        if not room:
+            self.members.pop(room_id, None)
+            return None
+        members = frozenset(room_participant_ids(room))
+        self.members[room_id] = (time.monotonic() + self.ttl, members)
+        self.members.move_to_end(room_id)
+        if len(self.members) > self.max_size:
+            self.members.popitem(last=False)
+        return members
+
+    async def is_member(self, room_id: str, user_id: Optional[str]) -> bool:
+        members = await self.get(room_id) if room_id and user_id else None
+        return members is not None and user_id in members
+
+    def invalidate(self, room_ids: List[str]):
+        for room_id in room_ids:
+            self.members.pop(room_id, None)
+
+    def metrics(self) -> dict:
+        return {"size": len(self.members), **self.stats}
+
+room_members = RoomMembershipCache(ROOM_MEMBERSHIP_CACHE_SIZE, ROOM_MEMBERSHIP_CACHE_TTL)
+MongoPubSubManager.app_handlers["invalidate_rooms"] = lambda message: room_members.invalidate(message["room_ids"])
+
+async def invalidate_room_members(room_ids: List[str]):
+    """Drop rooms from the membership cache of this and every other worker"""
+    room_members.invalidate(room_ids)
+    if isinstance(sio.manager, MongoPubSubManager):
+        await sio.manager._publish({"method": "invalidate_rooms", "room_ids": room_ids})
+
+async def authorize_room_member(room_id: str, user_id: str) -> frozenset:
+    """Members of the room; 404 if it does not exist and 403 if user_id is not one of them"""
+    members = await room_members.get(room_id)
+    if members is None:
+        raise HTTPException(status_code=404, detail="Chat room not found")
+    if user_id not in members:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    return members
+
+def last_message_update(message: dict):
+    """(filter, update) storing the last-message snapshot on the room; an older message never replaces a newer one"""
+    return (
+        {
+            "id": message["chat_room_id"],
+            "$or": [{"last_message_at": None}, {"last_message_at": {"$lte": message["created_at"]}}]
+        },
+        {"$set": {
+            "last_message_at": message["created_at"],
+            "last_message": last_message_snapshot(message),
+            "updated_at": datetime.utcnow()
+        }}
+    )
+
+async def record_room_message(message: dict):
+    """Store the last-message snapshot on the room and count the message as
+    unread for every other participant"""
+    await db.chat_rooms.update_one(*last_message_update(message))
+    for user_id in await room_members.get(message["chat_room_id"]) or ():
+        if user_id != message["sender_id"]:
+            await db.unread_counters.update_one(
+                {"user_id": user_id},
+                {"$inc": {f"rooms.{message['chat_room_id']}": 1, "total": 1}},
+                upsert=True
+            )
+
+async def allocate_message_seq(room_id: str) -> Optional[int]:
+    """Next sequence number of the room, or None if the room does not exist"""
+    room = await db.chat_rooms.find_one_and_update(
+        {"id": room_id},
+        {"$inc": {"message_seq": 1}},
+        projection={"_id": 0, "message_seq": 1},
+        return_document=ReturnDocument.AFTER
+    )
+    return room["message_seq"] if room else None
+
+# A seq is allocated before its message is stored, so a later seq can be committed
+# first. Readers resuming after a seq only return the gap-free prefix; a hole older
+# than the grace period is an allocation whose write failed and is skipped.
+SEQ_GAP_GRACE = timedelta(seconds=float(os.environ.get("SEQ_GAP_GRACE", "10")))
+
+def committed_prefix(room_id: str, messages: List[dict], after_seq: int):
+    """(messages up to the first seq that may still be in flight, whether any were held back).
+    messages are the room's messages after after_seq in seq order."""
+    expected = after_seq + 1
+    pending = message_write_buffer.pending_seqs(room_id)
+    now = datetime.utcnow()
+    for index, message in enumerate(messages):
+        if message["seq"] != expected:
+            in_flight = any(seq in pending for seq in range(expected, message["seq"]))
+            if in_flight or now - message["created_at"] < SEQ_GAP_GRACE:
+                return messages[:index], True
+        expected = message["seq"] + 1
+    return messages, False
+
+async def create_message(room_id: str, sender_id: str, text: str, client_message_id: Optional[str] = None,
+                         write_behind: bool = False):
+    """Store a message sent through REST or the socket; returns (message, created).
+    A repeated client_message_id returns the message stored the first time.
+    With write_behind the message is queued on message_write_buffer once it has its seq."""
+    if client_message_id:
+        existing = message_write_buffer.find(room_id, client_message_id) or await db.messages.find_one(
+            {"chat_room_id": room_id, "client_message_id": client_message_id}, {"_id": 0}
+        )
+        if existing:
+            return existing, False
+    seq = await allocate_message_seq(room_id)
+    if seq is None:
+        raise HTTPException(status_code=404, detail="Chat room not found")
+    message = Message(
+        chat_room_id=room_id,
+        sender_id=sender_id,
+        message=text,
+        seq=seq,
+        client_message_id=client_message_id
+    ).dict()
+    if not client_message_id:
+        message.pop("client_message_id")
+    if write_behind and message_write_buffer.add(message):
+        return message, True
+    try:
+        await db.messages.insert_one(message)
+    except DuplicateKeyError:
+        if not client_message_id:
+            raise
+        # The same client_message_id raced in through the other path
+        existing = await db.messages.find_one({"chat_room_id": room_id, "client_message_id": client_message_id}, {"_id": 0})
+        return existing, False
+    message.pop("_id", None)
+    # Update room's last_message_at, last-message snapshot and unread counters
+    await record_room_message(message)
+    return message, True
+
+# Opt-in write-behind for socket messages: they are broadcast as soon as they
+# have an id and seq, and written in batches every SOCKET_WRITE_BEHIND_INTERVAL.
+SOCKET_WRITE_BEHIND = os.environ.get("SOCKET_WRITE_BEHIND", "false").lower() in ("1", "true", "yes")
+SOCKET_WRITE_BEHIND_INTERVAL = float(os.environ.get("SOCKET_WRITE_BEHIND_INTERVAL", "0.1"))
+# Most messages held while the database is unreachable; beyond it messages are written directly
+SOCKET_WRITE_BEHIND_MAX_PENDING = int(os.environ.get("SOCKET_WRITE_BEHIND_MAX_PENDING", "10000"))
+# Failed flushes of a batch before its messages are written one at a time
+SOCKET_WRITE_BEHIND_MAX_ATTEMPTS = int(os.environ.get("SOCKET_WRITE_BEHIND_MAX_ATTEMPTS", "3"))
+# Batch ids remembered per unread-counter document to make flush retries idempotent
+UNREAD_FLUSH_HISTORY = 20
+
+def unread_increment(user_id: str, rooms: Dict[str, List[datetime]], batch_ids: List[str]):
+    """(filter, pipeline) counting buffered messages (room id -> creation times) as
+    unread for a user and recording batch_ids[0] as counted. A message the user has
+    read by now (see mark_room_read) is not counted: it was broadcast before the
+    flush. Does not match a counter document that has counted any of batch_ids."""
+    added = {
+        room_id: {"$size": {"$filter": {
+            "input": {"$literal": created},
+            "cond": {"$gt": ["$$this", {"$ifNull": [f"$read_at.{room_id}", None]}]}
+        }}}
+        for room_id, created in rooms.items()
+    }
+    return (
+        {"user_id": user_id, "flushes": {"$nin": batch_ids}},
+        [{"$set": {
+            **{f"rooms.{room_id}": {"$add": [{"$ifNull": [f"$rooms.{room_id}", 0]}, count]} for room_id, count in added.items()},
+            "total": {"$add": [{"$ifNull": ["$total", 0]}, *added.values()]},
+            "flushes": {"$slice": [{"$concatArrays": [{"$ifNull": ["$flushes", []]}, [batch_ids[0]]]}, -UNREAD_FLUSH_HISTORY]}
+        }}]
+    )
+
+class MessageWriteBuffer:
+    """Buffers new messages and writes them with one insert_many, one bulk room
+    update (the newest message per room) and one bulk unread-counter update per flush.
+    Every stage is idempotent, so a batch whose flush failed part-way is retried
+    as the same batch: stored messages hit the seq unique index, room updates are
+    guarded by last_message_at, and counter updates by the batch id. A batch that
+    still fails after max_attempts is written one message at a time, so that a
+    message the database rejects is dropped instead of holding back the rest."""
+
+    def __init__(self, interval: float, max_pending: int, max_attempts: int):
+        self.interval = interval
+        self.max_pending = max_pending
+        self.max_attempts = max_attempts
+        self.pending: List[dict] = []
+        # (batch id, messages) of a flush that failed; retried before anything newer
+        self.failed: Optional[tuple] = None
+        self.failed_attempts = 0
+        self.task: Optional[asyncio.Task] = None
+        self.stopping = asyncio.Event()
+        self.lock = asyncio.Lock()
+        self.stats = {
+            "flushes": 0, "messages_written": 0, "max_depth": 0, "failed_flushes": 0, "overflows": 0,
+            "superseded": 0, "dropped": 0, "last_flush_ms": None
+        }
+
+    def depth(self) -> int:
+        return len(self.pending) + (len(self.failed[1]) if self.failed else 0)
+
+    def add(self, message: dict) -> bool:
+        """Queue a message; False when the buffer is full and the caller must write it itself"""
+        if self.depth() >= self.max_pending:
+            self.stats["overflows"] += 1
+            return False
+        self.pending.append(message)
+        self.stats["max_depth"] = max(self.stats["max_depth"], self.depth())
+        return True
+
+    def pending_seqs(self, room_id: str) -> set:
+        return {message["seq"] for message in (self.failed[1] if self.failed else []) + self.pending
+                if message["chat_room_id"] == room_id}
+
+    def find(self, room_id: str, client_message_id: str) -> Optional[dict]:
+        for message in (self.failed[1] if self.failed else []) + self.pending:
+            if message["chat_room_id"] == room_id and message.get("client_message_id") == client_message_id:
+                return message
+        return None
+
+    def metrics(self) -> dict:
+        return {"enabled": SOCKET_WRITE_BEHIND, "depth": self.depth(), **self.stats}
+
+    def start(self):
+        if self.task is None:
+            self.stopping.clear()
+            self.task = asyncio.create_task(self._run())
+
+    async def close(self):
+        """Stop the flush loop, letting an in-flight flush finish, and write whatever is still buffered"""
+        if self.task is not None:
+            self.stopping.set()
+            await self.task
+            self.task = None
+        await self.flush()
+        if self.depth():
+            logging.error(f"{self.depth()} buffered messages could not be written before shutdown")
+
+    async def _run(self):
+        while not self.stopping.is_set():
+            try:
+                await asyncio.wait_for(self.stopping.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            await self.flush()
+
+    async def flush(self):
+        async with self.lock:
+            if self.failed is None:
+                if not self.pending:
+                    return
+                self.failed, self.pending = (str(uuid.uuid4()), self.pending), []
+                self.failed_attempts = 0
+            batch_id, batch = self.failed
+            if self.failed_attempts >= self.max_attempts:
+                await self._write_each(batch_id, batch)
+                return
+            started = time.perf_counter()
+            try:
+                superseded = await self._write(batch_id, batch)
+            except Exception as e:
+                # The batch stays in self.failed and is retried as is by the next flush
+                logging.error(f"Flushing {len(batch)} buffered messages failed: {e}")
+                self.stats["failed_flushes"] += 1
+                self.failed_attempts += 1
+                return
+            self.failed = None
+            self.stats["flushes"] += 1
+            self.stats["messages_written"] += len(batch) - len(superseded)
+            self.stats["last_flush_ms"] = round((time.perf_counter() - started) * 1000, 2)
+            await self._supersede(superseded)
+
+    async def _write_each(self, batch_id: str, batch: List[dict]):
+        """Write a batch that keeps failing one message at a time. Counters that
+        already counted the whole batch are not counted again."""
+        for index, message in enumerate(batch):
+            try:
+                superseded = await self._write(f"{batch_id}:{message['id']}", [message], counted_in=[batch_id])
+            except ConnectionFailure as e:
+                # The database is unreachable, not rejecting this message: retry later
+                logging.error(f"Writing buffered message {message['id']} failed: {e}")
+                self.failed = (batch_id, batch[index:])
+                return
+            except Exception as e:
+                logging.error(f"Dropping buffered message {message['id']} of room {message['chat_room_id']}: {e}")
+                self.stats["dropped"] += 1
+                continue
+            self.stats["messages_written"] += 1 - len(superseded)
+            await self._supersede(superseded)
+        self.failed = None
+
+    async def _supersede(self, superseded: List[tuple]):
+        """Tell the rooms that a broadcast message was a resend of one stored under another id"""
+        for message, stored in superseded:
+            self.stats["superseded"] += 1
+            await sio.emit('message_replaced', socket_payload({
+                'room_id': message["chat_room_id"], 'replaced_id': message["id"], 'message': stored
+            }), room=message["chat_room_id"])
+
+    async def _write(self, batch_id: str, batch: List[dict], counted_in: List[str] = ()) -> List[tuple]:
+        """Write one batch; returns (message, stored message) for every message whose
+        client_message_id was already stored under another id. Those are not written
+        and get no room or unread update: the stored message had its own."""
+        superseded = []
+        try:
+            await db.messages.insert_many([dict(message) for message in batch], ordered=False)
+        except BulkWriteError as e:
+            resends = []
+            for error in e.details["writeErrors"]:
+                if error["code"] != 11000:
+                    raise
+                if "client_message_id" in (error.get("keyPattern") or error.get("errmsg", "")):
+                    resends.append(batch[error["index"]])
+                # Any other duplicate key is the message itself, stored by an earlier attempt
+            for message in resends:
+                stored = await db.messages.find_one(
+                    {"chat_room_id": message["chat_room_id"], "client_message_id": message["client_message_id"]}, {"_id": 0}
+                )
+                if stored and stored["id"] != message["id"]:
+                    superseded.append((message, stored))
+            dropped = {message["id"] for message, _ in superseded}
+            batch = [message for message in batch if message["id"] not in dropped]
+
+        latest = {}
+        for message in batch:
+            if message["chat_room_id"] not in latest or message["seq"] > latest[message["chat_room_id"]]["seq"]:
+                latest[message["chat_room_id"]] = message
+        if latest:
+            await db.chat_rooms.bulk_write([UpdateOne(*last_message_update(message)) for message in latest.values()], ordered=False)
+
+        participants = {room_id: await room_members.get(room_id) for room_id in latest}
+        unread = defaultdict(lambda: defaultdict(list))
+        for message in batch:
+            for user_id in participants[message["chat_room_id"]] or ():
+                if user_id != message["sender_id"]:
+                    unread[user_id][message["chat_room_id"]].append(message["created_at"])
+        if unread:
+            # A counter document that already lists this batch does not match, and the
+            # upsert then fails on the unique user_id index instead of counting twice
+            try:
+                await db.unread_counters.bulk_write([
+                    UpdateOne(*unread_increment(user_id, rooms, [batch_id, *counted_in]), upsert=True)
+                    for user_id, rooms in unread.items()
+                ], ordered=False)
+            except BulkWriteError as e:
+                if any(error["code"] != 11000 for error in e.details["writeErrors"]):
+                    raise
+        return superseded
+
+message_write_buffer = MessageWriteBuffer(
+    SOCKET_WRITE_BEHIND_INTERVAL, SOCKET_WRITE_BEHIND_MAX_PENDING, SOCKET_WRITE_BEHIND_MAX_ATTEMPTS
+)
+
+def socket_payload(data):
+    """Make documents JSON-safe for Socket.IO (datetimes become ISO strings)"""
+    return jsonable_encoder(data)
+
+async def find_last_messages(room_ids: List[str]) -> dict:
+    """Latest message of each room in one grouped aggregation, keyed by room id"""
+    last_messages = {}
+    if room_ids:
+        pipeline = [
+            {"$match": {"chat_room_id": {"$in": room_ids}}},
+            {"$sort": {"chat_room_id": -1, "created_at": -1, "id": -1}},
+            {"$group": {"_id": "$chat_room_id", "message": {"$first": "$$ROOT"}}}
+        ]
+        async for group in db.messages.aggregate(pipeline):
+            group["message"].pop("_id", None)
+            last_messages[group["_id"]] = last_message_snapshot(group["message"])
+    return last_messages
+
+async def backfill_last_messages(batch_size: int = 500):
+    """One-off job: write the last-message snapshot of rooms created before it existed"""
+    query = {"last_message": None, "last_message_at": {"$ne": None}}
+    backfilled = 0
+    while True:
+        room_ids = [room["id"] async for room in db.chat_rooms.find(query, {"_id": 0, "id": 1}).limit(batch_size)]
+        if not room_ids:
+            break
+        last_messages = await find_last_messages(room_ids)
+        for room_id in room_ids:
+            if room_id in last_messages:
+                await db.chat_rooms.update_one({"id": room_id}, {"$set": {"last_message": last_messages[room_id]}})
             else:
-                provider_profile = await db.partner_profiles.find_one({"user_id": room.get("provider_user_id")})
-            
-            if provider_profile:
-                provider_profile.pop("_id", None)
-                room["provider_profile"] = provider_profile
-        
-        # Get last message
-        last_message = await db.messages.find_one(
-            {"chat_room_id": room["id"]},
-            sort=[("created_at", -1)]
+                # The room's messages are gone; don't pick it up again
+                await db.chat_rooms.update_one({"id": room_id}, {"$set": {"last_message_at": None}})
+        backfilled += len(room_ids)
+    logging.info(f"Backfilled last-message snapshots of {backfilled} chat rooms")
+
+async def mark_room_read(room_id: str, user_id: str) -> dict:
+    """Move the user's read cursor on the room to now (a single-document write)
+    and reset the user's unread counter for the room; returns the read cursors as they were before"""
+    now = datetime.utcnow()
+    room = await db.chat_rooms.find_one_and_update(
+        {"id": room_id},
+        {"$max": {f"last_read_at.{user_id}": now}, "$set": {"updated_at": now}},
+        projection={"_id": 0, "last_read_at": 1}
+    )
+    await db.unread_counters.update_one(*unread_reset(user_id, room_id, read_at=now), upsert=True)
+    return room or {}
+
+def unread_reset(user_id: str, room_id: str, read_at: Optional[datetime] = None):
+    """(filter, update) removing the room's count from the user's unread counters and total.
+    With read_at the user's read position on the room is recorded as well, so that
+    buffered messages sent before it are not counted when they are flushed."""
+    remove_count = {"$set": {"total": {"$max": [0, {"$subtract": [
+        {"$ifNull": ["$total", 0]}, {"$ifNull": [f"$rooms.{room_id}", 0]}
+    ]}]}}}
+    if read_at is None:
+        return (
+            {"user_id": user_id, "$or": [{f"rooms.{room_id}": {"$exists": True}}, {f"read_at.{room_id}": {"$exists": True}}]},
+            [remove_count, {"$unset": [f"rooms.{room_id}", f"read_at.{room_id}"]}]
+        )
+    return (
+        {"user_id": user_id},
+        [
+            remove_count,
+            {"$set": {f"read_at.{room_id}": {"$max": [f"$read_at.{room_id}", read_at]}}},
+            {"$unset": f"rooms.{room_id}"}
+        ]
+    )
+
+def apply_read_state(room: dict, messages: List[dict]) -> List[dict]:
+    """Derive is_read: a message is read once another participant's read cursor has passed it"""
+    read_cursors = room.get("last_read_at") or {}
+    for msg in messages:
+        msg["is_read"] = msg.get("is_read", False) or any(
+            read_at >= msg["created_at"] for user_id, read_at in read_cursors.items() if user_id != msg["sender_id"]
+        )
+    return messages
+
+def chat_room_query(user: dict) -> Optional[dict]:
+    """Filter for the chat rooms a user takes part in"""
+    if user["user_type"] == "venue":
+        return {"venue_user_id": user["id"]}
+    elif user["user_type"] == "artist":
+        # Get venue chats, artist-to-artist chats, AND cross-type chats
+        return {
+            "$or": [
+                {"provider_user_id": user["id"]},  # Venue chats as provider
+                {"participant1_id": user["id"]},   # Artist-to-artist chats
+                {"participant2_id": user["id"]},   # Artist-to-artist chats
+                {"venue_user_id": user["id"]}      # Cross-type chats (artist as initiator)
+            ]
+        }
+    elif user["user_type"] == "partner":
+        # Get venue chats, partner-to-partner chats, AND cross-type chats
+        return {
+            "$or": [
+                {"provider_user_id": user["id"]},  # Venue/cross-type chats as provider
+                {"participant1_id": user["id"]},   # Partner-to-partner chats
+                {"participant2_id": user["id"]},   # Partner-to-partner chats
+                {"venue_user_id": user["id"]}      # Cross-type chats (partner as initiator)
+            ]
+        }
+    return None
+
+# Delta queries reach back this far before `since` so that a write stamped just
+# before a sync but committed after it is not missed; clients upsert rooms by id.
+CHAT_SYNC_OVERLAP = timedelta(seconds=5)
+
+async def delete_chat_rooms(query: dict):
+    """Delete chat rooms, leaving tombstones for the delta sync of their participants"""
+    rooms = await db.chat_rooms.find(query, {**ROOM_PARTICIPANT_PROJECTION, "id": 1}).to_list(None)
+    if not rooms:
+        return
+    now = datetime.utcnow()
+    await db.chat_room_tombstones.insert_many([
+        {"room_id": room["id"], "user_ids": room_participant_ids(room), "deleted_at": now} for room in rooms
+    ])
+    room_ids = [room["id"] for room in rooms]
+    await db.chat_rooms.delete_many({"id": {"$in": room_ids}})
+    await invalidate_room_members(room_ids)
+    # Unread counts of a deleted room could never be read away
+    resets = [UpdateOne(*unread_reset(user_id, room["id"])) for room in rooms for user_id in room_participant_ids(room)]
+    if resets:
+        await db.unread_counters.bulk_write(resets, ordered=False)
+
+async def get_chat_room_changes(user: dict, query: dict, since: datetime, limit: int, cursor: Optional[str] = None) -> dict:
+    """Rooms changed since `since` (oldest change first) and ids of rooms deleted since then"""
+    if since.tzinfo is not None:
+        since = since.astimezone(timezone.utc).replace(tzinfo=None)
+    now = datetime.utcnow()
+    if since < now - timedelta(days=CHAT_TOMBSTONE_TTL_DAYS):
+        raise HTTPException(status_code=410, detail="Sync point expired, reload the full chat list")
+    window_start = since - CHAT_SYNC_OVERLAP
+
+    rooms, next_cursor = await fetch_page(
+        db.chat_rooms,
+        {"$and": [query, {"updated_at": {"$gte": window_start}}]},
+        [("updated_at", ASCENDING), ("id", ASCENDING)],
+        limit,
+        cursor
+    )
+    tombstones = await db.chat_room_tombstones.find(
+        {"user_ids": user["id"], "deleted_at": {"$gte": window_start}}, {"_id": 0, "room_id": 1}
+    ).to_list(None)
+    await enrich_chat_rooms(rooms)
+    return {
+        "rooms": rooms,
+        "deleted_room_ids": [tombstone["room_id"] for tombstone in tombstones],
+        # More changes follow with the same `since` and this cursor; otherwise sync again from `since`
+        "next_cursor": next_cursor,
+        "since": now
+    }
+
+@api_router.get("/chat/rooms")
+async def get_chat_rooms(
+    response: Response,
+    cursor: Optional[str] = None,
+    since: Optional[datetime] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    current_user: dict = Depends(get_current_user)
+):
+    """Chat rooms of the current user, newest first. The first page of a full load
+    carries the server's sync point in X-Sync-Since; with `since` (that value, or the
+    one returned by the previous sync) only rooms changed since then are returned,
+    together with the ids of rooms deleted since then."""
+    query = chat_room_query(current_user)
+    if since is not None:
+        if query is None:
+            return {"rooms": [], "deleted_room_ids": [], "next_cursor": None, "since": datetime.utcnow()}
+        changes = await get_chat_room_changes(current_user, query, since, limit, cursor)
+        set_next_cursor(response, changes["next_cursor"])
+        return changes
+
+    if cursor is None:
+        # Taken before reading, so changes made during the load are picked up by the next sync
+        response.headers["X-Sync-Since"] = datetime.utcnow().isoformat()
+    rooms = []
+    if query is not None:
+        rooms, next_cursor = await fetch_page(
+            db.chat_rooms, query, [("created_at", DESCENDING), ("id", DESCENDING)], limit, cursor
         )
-        if last_message:
-            last_message.pop("_id", None)
-            room["last_message"] = last_message
+        set_next_cursor(response, next_cursor)
     
+    await enrich_chat_rooms(rooms)
     return rooms
 
-@api_router.get("/chat/messages/{room_id}")
-async def get_messages(room_id: str, current_user: dict = Depends(get_current_user)):
-    # Verify user is part of this room
-    room = await db.chat_rooms.find_one({"id": room_id})
+@api_router.get("/chat/rooms/{room_id}")
+async def get_chat_room(room_id: str, current_user: dict = Depends(get_current_user)):
+    await authorize_room_member(room_id, current_user["id"])
+    room = await db.chat_rooms.find_one({"id": room_id}, {"_id": 0})
     if not room:
         raise HTTPException(status_code=404, detail="Chat room not found")
-    
-    # Check if user is authorized for this chat
-    is_authorized = False
-    
-    # Artist-to-artist or partner-to-partner chat
-    if room.get("chat_type") in ["artist_artist", "partner_partner"]:
-        if current_user["id"] in [room.get("participant1_id"), room.get("participant2_id")]:
-            is_authorized = True
-    # Venue chat
-    elif room.get("venue_user_id") == current_user["id"] or room.get("provider_user_id") == current_user["id"]:
-        is_authorized = True
-    
-    if not is_authorized:
-        raise HTTPException(status_code=403, detail="Not authorized")
-    
-    messages = await db.messages.find({"chat_room_id": room_id}).sort("created_at", 1).to_list(1000)
+    await enrich_chat_rooms([room])
+    return room
+
+@api_router.get("/chat/presence")
+async def get_presence(user_ids: str, current_user: dict = Depends(get_current_user)):
+    """Online status of a comma-separated list of users. Only users the caller shares a
+    chat room with are reported; other ids are left out of the result."""
+    user_ids = [user_id for user_id in user_ids.split(",") if user_id]
+    if len(user_ids) > MAX_PAGE_SIZE:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_PAGE_SIZE} user ids per request")
+    query = chat_room_query(current_user)
+    if query is None or not user_ids:
+        return {}
+    partners = set()
+    rooms = db.chat_rooms.find(
+        {"$and": [query, {"$or": [{field: {"$in": user_ids}} for field in ROOM_PARTICIPANT_FIELDS]}]},
+        ROOM_PARTICIPANT_PROJECTION
+    )
+    async for room in rooms:
+        partners.update(room_participant_ids(room))
+    partners = [user_id for user_id in user_ids if user_id in partners and user_id != current_user["id"]]
+    online = await online_user_ids(partners)
+    return {user_id: user_id in online for user_id in partners}
+
+@api_router.get("/chat/unread")
+async def get_unread_counts(current_user: dict = Depends(get_current_user)):
+    """Unread message counts per room and in total, for the app badge"""
+    counters = await db.unread_counters.find_one({"user_id": current_user["id"]}, {"_id": 0, "rooms": 1, "total": 1})
+    counters = counters or {}
+    rooms = {room_id: count for room_id, count in counters.get("rooms", {}).items() if count}
+    return {"rooms": rooms, "total": counters.get("total", 0)}
+
+@api_router.get("/chat/messages/{room_id}")
+async def get_messages(
+    room_id: str,
+    response: Response,
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+    after_seq: Optional[int] = Query(None, ge=0),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    current_user: dict = Depends(get_current_user)
+):
+    """Messages in chronological order: the latest `limit` by default, the page older
+    than `before`, or the page newer than `after`. X-Before-Cursor is set when older
+    messages remain; X-After-Cursor always points after the newest message returned.
+    `after_seq` returns the messages following a known sequence number, for resync
+    after a reconnect. It stops before a seq that is allocated but not stored yet, so
+    X-Has-More is set when the gap is longer than `limit` or messages were held back."""
+    if sum(value is not None for value in (before, after, after_seq)) > 1:
+        raise HTTPException(status_code=400, detail="Use only one of before, after and after_seq")
+    # Verify user is part of this room
+    await authorize_room_member(room_id, current_user["id"])
+    
+    query = {"chat_room_id": room_id}
+    if after_seq is not None:
+        messages = await db.messages.find(
+            {"chat_room_id": room_id, "seq": {"$gt": after_seq}}
+        ).sort("seq", ASCENDING).limit(limit + 1).to_list(limit + 1)
+        has_more = len(messages) > limit
+        messages, held_back = committed_prefix(room_id, messages[:limit], after_seq)
+        if has_more or held_back:
+            response.headers["X-Has-More"] = "true"
+    elif after:
+        messages, _ = await fetch_page(db.messages, query, [("created_at", ASCENDING), ("id", ASCENDING)], limit, after)
+    else:
+        messages, before_cursor = await fetch_page(
+            db.messages, query, [("created_at", DESCENDING), ("id", DESCENDING)], limit, before
+        )
+        messages.reverse()
+        if before_cursor:
+            response.headers["X-Before-Cursor"] = before_cursor
+    if messages:
+        response.headers["X-After-Cursor"] = encode_cursor([messages[-1]["created_at"], messages[-1]["id"]])
+    elif after:
+        response.headers["X-After-Cursor"] = after
     for msg in messages:
         msg.pop("_id", None)
     
     # Mark messages as read
-    await db.messages.update_many(
-        {"chat_room_id": room_id, "sender_id": {"$ne": current_user["id"]}},
-        {"$set": {"is_read": True}}
-    )
+    room = await mark_room_read(room_id, current_user["id"])
     
-    return messages
+    return apply_read_state(room, messages)
 
 @api_router.post("/chat/messages")
 async def send_message(message_data: dict, current_user: dict = Depends(get_current_user)):
@@ -1036,60 +3049,41 @@ async def send_message(message_data: dict, current_user: dict = Depends(get_curr
         raise HTTPException(status_code=400, detail="room_id and message are required")
     
     # Verify user is part of this room
-    room = await db.chat_rooms.find_one({"id": room_id})
-    if not room:
-        raise HTTPException(status_code=404, detail="Chat room not found")
-    
-    # Check if user is authorized for this chat
-    is_authorized = False
-    
-    # Artist-to-artist or partner-to-partner chat
-    if room.get("chat_type") in ["artist_artist", "partner_partner"]:
-        if current_user["id"] in [room.get("participant1_id"), room.get("participant2_id")]:
-            is_authorized = True
-    # Venue chat
-    elif room.get("venue_user_id") == current_user["id"] or room.get("provider_user_id") == current_user["id"]:
-        is_authorized = True
-    
-    if not is_authorized:
-        raise HTTPException(status_code=403, detail="Not authorized")
+    await authorize_room_member(room_id, current_user["id"])
     
     # Create new message
-    new_message = {
-        "id": str(uuid.uuid4()),
-        "chat_room_id": room_id,
-        "sender_id": current_user["id"],
-        "message": message_text,
-        "is_read": False,
-        "created_at": datetime.utcnow()
-    }
-    
-    await db.messages.insert_one(new_message)
-    
-    # Update room's last_message_at
-    await db.chat_rooms.update_one(
-        {"id": room_id},
-        {"$set": {"last_message_at": datetime.utcnow()}}
+    new_message, _ = await create_message(
+        room_id, current_user["id"], message_text, message_data.get("client_message_id")
     )
-    
-    new_message.pop("_id", None)
     return new_message
 
 # ==================== ADMIN ROUTES ====================
 
 @api_router.get("/admin/chats")
-async def get_all_chats(current_user: dict = Depends(get_current_user)):
+async def get_all_chats(
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE),
+    current_user: dict = Depends(get_current_user)
+):
     if current_user["user_type"] != "admin":
         raise HTTPException(status_code=403, detail="Admin access required")
     
-    rooms = await db.chat_rooms.find().to_list(1000)
+    rooms, next_cursor = await fetch_page(
+        db.chat_rooms, {}, [("created_at", DESCENDING), ("id", DESCENDING)], limit, cursor
+    )
+    set_next_cursor(response, next_cursor)
     result = []
     
     for room in rooms:
         room.pop("_id", None)
-        messages = await db.messages.find({"chat_room_id": room["id"]}).sort("created_at", 1).to_list(1000)
+        # Latest ADMIN_TRANSCRIPT_LIMIT messages of each room, oldest first
+        messages = await db.messages.find({"chat_room_id": room["id"]}).sort("created_at", -1).to_list(ADMIN_TRANSCRIPT_LIMIT + 1)
+        room["has_more_messages"] = len(messages) > ADMIN_TRANSCRIPT_LIMIT
+        messages = messages[:ADMIN_TRANSCRIPT_LIMIT][::-1]
         for msg in messages:
             msg.pop("_id", None)
+        apply_read_state(room, messages)
         
         # Handle different chat types
         user1_profile = None
@@ -1139,12 +3133,20 @@ async def get_all_chats(current_user: dict = Depends(get_current_user)):
     return result
 
 @api_router.get("/admin/reports")
-async def get_all_reports(current_user: dict = Depends(get_current_user)):
+async def get_all_reports(
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    current_user: dict = Depends(get_current_user)
+):
     """Get all user reports for admin dashboard"""
     if current_user["user_type"] != "admin":
         raise HTTPException(status_code=403, detail="Admin access required")
     
-    reports = await db.user_reports.find().sort("created_at", -1).to_list(1000)
+    reports, next_cursor = await fetch_page(
+        db.user_reports, {}, [("created_at", DESCENDING), ("id", DESCENDING)], limit, cursor
+    )
+    set_next_cursor(response, next_cursor)
     
     # Enrich reports with user information
     enriched_reports = []
@@ -1190,6 +3192,7 @@ async def delete_user(user_id: str, current_user: dict = Depends(get_current_use
     
     # Delete user and associated profiles
     await db.users.delete_one({"id": user_id})
+    principals.invalidate(user_id)
     await db.artist_profiles.delete_many({"user_id": user_id})
     await db.partner_profiles.delete_many({"user_id": user_id})
     await db.venue_profiles.delete_many({"user_id": user_id})
@@ -1289,13 +3292,14 @@ async def forgot_password(data: dict):
         raise HTTPException(status_code=404, detail="User not found with this email")
     
     # Hash new password
-    hashed_password = pwd_context.hash(new_password)
+    hashed_password = await get_password_hash(new_password)
     
     # Update password in database
     result = await db.users.update_one(
         {"email": email}, 
         {"$set": {"password": hashed_password}}
     )
+    principals.invalidate(user["id"])
     
     if result.modified_count == 0:
         raise HTTPException(status_code=500, detail="Failed to update password")
@@ -1647,6 +3651,7 @@ async def verify_artist_pro_payment(data: dict, current_user: dict = Depends(get
             {"id": current_user["id"]},
             {"$set": {"is_artist_pro": True}}
         )
+        principals.invalidate(current_user["id"])
         
         return {"message": "Payment verified successfully (test mode)", "status": "active"}
     
@@ -1682,6 +3687,7 @@ async def verify_artist_pro_payment(data: dict, current_user: dict = Depends(get
         {"id": current_user["id"]},
         {"$set": {"is_artist_pro": True}}
     )
+    principals.invalidate(current_user["id"])
     
     return {"message": "Payment verified and Artist Pro subscription activated", "status": "active"}
 
@@ -1769,6 +3775,7 @@ async def verify_partner_pro_payment(data: dict, current_user: dict = Depends(ge
             {"id": current_user["id"]},
             {"$set": {"is_partner_pro": True}}
         )
+        principals.invalidate(current_user["id"])
         
         return {"message": "Payment verified successfully (test mode)", "status": "active"}
     
@@ -1823,6 +3830,7 @@ async def verify_partner_pro_payment(data: dict, current_user: dict = Depends(ge
         {"id": current_user["id"]},
         {"$set": {"is_partner_pro": True}}
     )
+    principals.invalidate(current_user["id"])
     
     return {"message": "Payment verified and Partner Pro subscription activated", "status": "active"}
 
@@ -1972,6 +3980,7 @@ async def verify_venue_pro_payment(data: dict, current_user: dict = Depends(get_
             {"id": current_user["id"]},
             {"$set": {"is_venue_pro": True}}
         )
+        principals.invalidate(current_user["id"])
         
         return {"message": "Payment verified successfully (test mode)", "status": "active"}
     
@@ -2007,6 +4016,7 @@ async def verify_venue_pro_payment(data: dict, current_user: dict = Depends(get_
         {"id": current_user["id"]},
         {"$set": {"is_venue_pro": True}}
     )
+    principals.invalidate(current_user["id"])
     
     return {"message": "Payment verified and Host Pro subscription activated", "status": "active"}
 
@@ -2102,6 +4112,7 @@ async def block_user(user_id: str, current_user: dict = Depends(get_current_user
         {"id": current_user["id"]},
         {"$addToSet": {"blocked_users": user_id}}
     )
+    principals.invalidate(current_user["id"])
     
     return {"message": "User blocked successfully"}
 
@@ -2112,6 +4123,7 @@ async def unblock_user(user_id: str, current_user: dict = Depends(get_current_us
         {"id": current_user["id"]},
         {"$pull": {"blocked_users": user_id}}
     )
+    principals.invalidate(current_user["id"])
     
     return {"message": "User unblocked successfully"}
 
@@ -2162,6 +4174,7 @@ async def update_chat_settings(data: dict, current_user: dict = Depends(get_curr
         {"id": current_user["id"]},
         {"$set": {"partner_chat_settings": chat_settings}}
     )
+    principals.invalidate(current_user["id"])
     
     return {"message": "Chat settings updated", "chat_settings": chat_settings}
 
@@ -2265,14 +4278,30 @@ async def approve_collaboration(collaboration_id: str, current_user: dict = Depe
     return {"message": message, "both_approved": both_approved}
 
 @api_router.get("/collaborations")
-async def get_collaborations(current_user: dict = Depends(get_current_user)):
-    """Get collaborations for current user"""
-    collaborations = await db.collaborations.find({
+async def get_collaborations(
+    response: Response,
+    chat_room_id: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    current_user: dict = Depends(get_current_user)
+):
+    """Get collaborations for current user, optionally only those of one chat room"""
+    query = {
         "$or": [
             {"participant1_id": current_user["id"]},
             {"participant2_id": current_user["id"]}
         ]
-    }).to_list(1000)
+    }
+    if chat_room_id:
+        query["chat_room_id"] = chat_room_id
+    collaborations, next_cursor = await fetch_page(
+        db.collaborations,
+        query,
+        [("created_at", DESCENDING), ("id", DESCENDING)],
+        limit,
+        cursor
+    )
+    set_next_cursor(response, next_cursor)
     
     for collab in collaborations:
         collab.pop("_id", None)
@@ -2280,12 +4309,20 @@ async def get_collaborations(current_user: dict = Depends(get_current_user)):
     return collaborations
 
 @api_router.get("/collaborations/approved")
-async def get_approved_collaborations():
+async def get_approved_collaborations(
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE)
+):
     """Get all approved collaborations for home page display"""
-    collaborations = await db.collaborations.find({
-        "participant1_approved": True,
-        "participant2_approved": True
-    }).to_list(1000)
+    collaborations, next_cursor = await fetch_page(
+        db.collaborations,
+        {"participant1_approved": True, "participant2_approved": True},
+        [("created_at", DESCENDING), ("id", DESCENDING)],
+        limit,
+        cursor
+    )
+    set_next_cursor(response, next_cursor)
     
     for collab in collaborations:
         collab.pop("_id", None)
@@ -2312,7 +4349,7 @@ async def admin_add_artist(artist_data: dict, current_user: dict = Depends(get_c
     user = {
         "id": str(uuid.uuid4()),
         "email": email,
-        "password": pwd_context.hash(password),
+        "password": await get_password_hash(password),
         "user_type": "artist",
         "is_paused": False,
         "created_at": datetime.utcnow()
@@ -2329,7 +4366,7 @@ async def admin_add_artist(artist_data: dict, current_user: dict = Depends(get_c
         "experience_gigs": artist_data.get("experience_gigs", 0),
         "availability": artist_data.get("availability", []),
         "locations": artist_data.get("locations", []),
-        "media_gallery": artist_data.get("media_gallery", []),
+        "media_gallery": [await ingest_media_value(value) for value in artist_data.get("media_gallery", [])],
         "rating": 0,
         "review_count": 0,
         "is_featured": False,
@@ -2360,7 +4397,7 @@ async def admin_add_partner(partner_data: dict, current_user: dict = Depends(get
     user = {
         "id": str(uuid.uuid4()),
         "email": email,
-        "password": pwd_context.hash(password),
+        "password": await get_password_hash(password),
         "user_type": "partner",
         "is_paused": False,
         "created_at": datetime.utcnow()
@@ -2374,7 +4411,7 @@ async def admin_add_partner(partner_data: dict, current_user: dict = Depends(get
         "service_type": partner_data.get("service_type", "General"),
         "description": partner_data.get("description", ""),
         "locations": partner_data.get("locations", []),
-        "media_gallery": partner_data.get("media_gallery", []),
+        "media_gallery": [await ingest_media_value(value) for value in partner_data.get("media_gallery", [])],
         "rating": 0,
         "review_count": 0,
         "is_featured": False,
@@ -2394,13 +4431,14 @@ async def admin_delete_artist(artist_id: str, current_user: dict = Depends(get_c
     if current_user["user_type"] != "admin":
         raise HTTPException(status_code=403, detail="Admin access required")
     
-    artist = await db.artist_profiles.find_one({"id": artist_id})
+    artist = await db.artist_profiles.find_one({"id": artist_id}, {"_id": 0, "user_id": 1})
     if not artist:
         raise HTTPException(status_code=404, detail="Artist not found")
     
     # Delete profile and user
     await db.artist_profiles.delete_one({"id": artist_id})
     await db.users.delete_one({"id": artist["user_id"]})
+    principals.invalidate(artist["user_id"])
     
     return {"message": "Artist deleted successfully"}
 
@@ -2410,12 +4448,13 @@ async def admin_delete_partner(partner_id: str, current_user: dict = Depends(get
     if current_user["user_type"] != "admin":
         raise HTTPException(status_code=403, detail="Admin access required")
     
-    partner = await db.partner_profiles.find_one({"id": partner_id})
+    partner = await db.partner_profiles.find_one({"id": partner_id}, {"_id": 0, "user_id": 1})
     if not partner:
         raise HTTPException(status_code=404, detail="Partner not found")
     
     await db.partner_profiles.delete_one({"id": partner_id})
     await db.users.delete_one({"id": partner["user_id"]})
+    principals.invalidate(partner["user_id"])
     
     return {"message": "Partner deleted successfully"}
 
@@ -2444,7 +4483,7 @@ async def create_featured_order(request: FeaturedPaymentRequest, current_user: d
     
     # Verify user owns this profile
     collection = db.artist_profiles if request.profile_type == "artist" else db.partner_profiles
-    profile = await collection.find_one({"id": request.profile_id})
+    profile = await collection.find_one({"id": request.profile_id}, {"_id": 0, "user_id": 1})
     
     if not profile or profile["user_id"] != current_user["id"]:
         raise HTTPException(status_code=403, detail="Not authorized")
@@ -2550,6 +4589,7 @@ async def pause_profile(current_user: dict = Depends(get_current_user)):
         {"id": current_user["id"]},
         {"$set": {"is_paused": True}}
     )
+    principals.invalidate(current_user["id"])
     return {"message": "Profile paused successfully"}
 
 @api_router.delete("/profile/delete")
@@ -2559,17 +4599,30 @@ async def delete_profile(current_user: dict = Depends(get_current_user)):
     
     # Delete all associated data
     await db.users.delete_one({"id": user_id})
+    principals.invalidate(user_id)
     await db.artist_profiles.delete_many({"user_id": user_id})
     await db.partner_profiles.delete_many({"user_id": user_id})
     await db.venue_profiles.delete_many({"user_id": user_id})
     await db.reviews.delete_many({"reviewer_id": user_id})
     await db.wishlists.delete_many({"venue_user_id": user_id})
-    await db.chat_rooms.delete_many({"$or": [{"venue_user_id": user_id}, {"provider_user_id": user_id}]})
+    await delete_chat_rooms({"$or": [{"venue_user_id": user_id}, {"provider_user_id": user_id}]})
+    await db.unread_counters.delete_one({"user_id": user_id})
     
     return {"message": "Profile permanently deleted"}
 
 # ==================== ADMIN ANALYTICS ROUTES ====================
 
+async def rating_stats(collection) -> dict:
+    """Average of non-zero ratings and total review count for a profile collection"""
+    stats = await collection.aggregate([
+        {"$group": {
+            "_id": None,
+            "avg_rating": {"$avg": {"$cond": [{"$gt": ["$rating", 0]}, "$rating", None]}},
+            "review_count": {"$sum": {"$ifNull": ["$review_count", 0]}}
+        }}
+    ]).to_list(1)
+    return stats[0] if stats else {"avg_rating": None, "review_count": 0}
+
 @api_router.get("/admin/analytics")
 async def get_analytics(current_user: dict = Depends(get_current_user)):
     if current_user["user_type"] != "admin":
@@ -2597,23 +4650,23 @@ async def get_analytics(current_user: dict = Depends(get_current_user)):
     })
     active_chats = len(active_chat_rooms)
     
-    # Rating statistics
-    all_artists = await db.artist_profiles.find().to_list(1000)
-    all_partners = await db.partner_profiles.find().to_list(1000)
+    # Rating statistics (aggregated in MongoDB rather than loading every profile)
+    artist_stats = await rating_stats(db.artist_profiles)
+    partner_stats = await rating_stats(db.partner_profiles)
     
-    artist_ratings = [a["rating"] for a in all_artists if a.get("rating", 0) > 0]
-    partner_ratings = [p["rating"] for p in all_partners if p.get("rating", 0) > 0]
-    
-    avg_artist_rating = sum(artist_ratings) / len(artist_ratings) if artist_ratings else 0
-    avg_partner_rating = sum(partner_ratings) / len(partner_ratings) if partner_ratings else 0
+    avg_artist_rating = artist_stats["avg_rating"] or 0
+    avg_partner_rating = partner_stats["avg_rating"] or 0
     
     # Featured listings
     featured_artists = await db.artist_profiles.count_documents({"is_featured": True})
     featured_partners = await db.partner_profiles.count_documents({"is_featured": True})
     
     # Revenue from featured (if payment orders exist)
-    completed_orders = await db.payment_orders.find({"status": "completed"}).to_list(1000)
-    total_revenue = sum(order.get("amount", 0) for order in completed_orders) / 100  # Convert paise to rupees
+    revenue = await db.payment_orders.aggregate([
+        {"$match": {"status": "completed"}},
+        {"$group": {"_id": None, "amount": {"$sum": "$amount"}}}
+    ]).to_list(1)
+    total_revenue = (revenue[0]["amount"] if revenue else 0) / 100  # Convert paise to rupees
     
     # Growth stats (new users last 30 days)
     thirty_days_ago = datetime.utcnow() - timedelta(days=30)
@@ -2638,7 +4691,7 @@ async def get_analytics(current_user: dict = Depends(get_current_user)):
         "ratings": {
             "avg_artist_rating": round(avg_artist_rating, 2),
             "avg_partner_rating": round(avg_partner_rating, 2),
-            "total_reviews": sum(a.get("review_count", 0) for a in all_artists) + sum(p.get("review_count", 0) for p in all_partners)
+            "total_reviews": artist_stats["review_count"] + partner_stats["review_count"]
         },
         "featured": {
             "artists": featured_artists,
@@ -2647,96 +4700,339 @@ async def get_analytics(current_user: dict = Depends(get_current_user)):
         }
     }
 
+@api_router.get("/admin/metrics")
+async def get_metrics(current_user: dict = Depends(get_current_user)):
+    """In-process runtime metrics of this worker"""
+    if current_user["user_type"] != "admin":
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return {
+        "socket_write_buffer": message_write_buffer.metrics(),
+        "typing": typing_coalescer.metrics(),
+        "room_membership": room_members.metrics(),
+        "principals": principals.metrics(),
+        "password_hasher": password_hasher.metrics()
+    }
+
 # ==================== SOCKET.IO EVENTS ====================
 
-connected_users = {}  # {user_id: sid}
+class SessionRegistry:
+    """Socket sessions of this process, indexed both ways: sid -> session and
+    user id -> sids. A user may be connected from several devices at once."""
+
+    def __init__(self):
+        self.sessions: Dict[str, dict] = {}
+        self.user_sids: Dict[str, set] = {}
+
+    def connect(self, sid: str):
+        self.sessions[sid] = {"user_id": None, "connected_at": datetime.utcnow(), "rooms": set()}
+
+    def authenticate(self, sid: str, user_id: str):
+        session = self.sessions.setdefault(sid, {"user_id": None, "connected_at": datetime.utcnow(), "rooms": set()})
+        if session["user_id"] and session["user_id"] != user_id:
+            self._unlink(sid, session["user_id"])
+        session["user_id"] = user_id
+        self.user_sids.setdefault(user_id, set()).add(sid)
+
+    def join(self, sid: str, room_id: str):
+        if sid in self.sessions:
+            self.sessions[sid]["rooms"].add(room_id)
+
+    def leave(self, sid: str, room_id: str):
+        if sid in self.sessions:
+            self.sessions[sid]["rooms"].discard(room_id)
+
+    def disconnect(self, sid: str) -> Optional[dict]:
+        session = self.sessions.pop(sid, None)
+        if session and session["user_id"]:
+            self._unlink(sid, session["user_id"])
+        return session
+
+    def _unlink(self, sid: str, user_id: str):
+        sids = self.user_sids.get(user_id)
+        if sids is not None:
+            sids.discard(sid)
+            if not sids:
+                del self.user_sids[user_id]
+
+    def user_for(self, sid: str) -> Optional[str]:
+        session = self.sessions.get(sid)
+        return session["user_id"] if session else None
+
+    def sids_for(self, user_id: str) -> set:
+        return set(self.user_sids.get(user_id, ()))
+
+    def is_online(self, user_id: str) -> bool:
+        return user_id in self.user_sids
+
+session_registry = SessionRegistry()
+
+# The registry only knows this worker's sockets. With several workers
+# (SOCKETIO_PUBSUB=mongo) each one also records, per user, how many sockets it
+# holds in socket_presence and refreshes seen_at every PRESENCE_HEARTBEAT seconds;
+# entries that stop being refreshed belong to a dead worker and are ignored.
+PRESENCE_HEARTBEAT = float(os.environ.get("PRESENCE_HEARTBEAT", "30"))
+WORKER_ID = str(uuid.uuid4())
+
+async def publish_presence(user_id: str):
+    if SOCKETIO_PUBSUB != "mongo":
+        return
+    key = {"user_id": user_id, "worker_id": WORKER_ID}
+    connections = len(session_registry.sids_for(user_id))
+    if connections:
+        await db.socket_presence.update_one(
+            key, {"$set": {"connections": connections, "seen_at": datetime.utcnow()}}, upsert=True
+        )
+    else:
+        await db.socket_presence.delete_one(key)
+
+async def online_user_ids(user_ids: List[str]) -> set:
+    """The users of user_ids connected to any worker"""
+    if SOCKETIO_PUBSUB != "mongo":
+        return {user_id for user_id in user_ids if session_registry.is_online(user_id)}
+    fresh = datetime.utcnow() - timedelta(seconds=2 * PRESENCE_HEARTBEAT)
+    entries = db.socket_presence.find({"user_id": {"$in": user_ids}, "seen_at": {"$gte": fresh}}, {"_id": 0, "user_id": 1})
+    return {entry["user_id"] async for entry in entries}
+
+async def presence_heartbeat():
+    while True:
+        await asyncio.sleep(PRESENCE_HEARTBEAT)
+        try:
+            await db.socket_presence.update_many({"worker_id": WORKER_ID}, {"$set": {"seen_at": datetime.utcnow()}})
+        except Exception as e:
+            logging.error(f"Presence heartbeat failed: {e}")
 
 @sio.event
-async def connect(sid, environ):
+async def connect(sid, environ, auth=None):
+    """Clients may pass their access token as the connection auth ({token}); the socket
+    is then bound to that user straight away. A bad token refuses the connection."""
+    session_registry.connect(sid)
+    token = auth.get('token') if isinstance(auth, dict) else None
+    if token:
+        user = await authenticate_token(token)
+        if user is None:
+            session_registry.disconnect(sid)
+            raise socketio.exceptions.ConnectionRefusedError('Invalid token')
+        session_registry.authenticate(sid, user["id"])
+        await publish_presence(user["id"])
     logging.info(f"Client connected: {sid}")
 
 @sio.event
 async def disconnect(sid):
     logging.info(f"Client disconnected: {sid}")
-    # Remove from connected users
-    user_to_remove = None
-    for user_id, socket_id in connected_users.items():
-        if socket_id == sid:
-            user_to_remove = user_id
-            break
-    if user_to_remove:
-        del connected_users[user_to_remove]
+    session = session_registry.disconnect(sid)
+    if session and session["user_id"]:
+        await publish_presence(session["user_id"])
+    await typing_coalescer.clear_sid(sid)
+
+# Most messages replayed per room on resume; longer gaps are fetched with GET ...?after_seq=
+SOCKET_REPLAY_LIMIT = 200
+
+async def find_missed_messages(room_id: str, last_seq: int) -> dict:
+    messages = await db.messages.find(
+        {"chat_room_id": room_id, "seq": {"$gt": last_seq}}, {"_id": 0}
+    ).sort("seq", ASCENDING).limit(SOCKET_REPLAY_LIMIT + 1).to_list(SOCKET_REPLAY_LIMIT + 1)
+    replay, held_back = committed_prefix(room_id, messages[:SOCKET_REPLAY_LIMIT], last_seq)
+    return {
+        "room_id": room_id,
+        "messages": replay,
+        "has_more": held_back or len(messages) > SOCKET_REPLAY_LIMIT
+    }
+
+async def resume_rooms(sid, positions: dict):
+    """Join rooms and send everything after the client's last seen seq in one `missed_messages` event.
+    positions maps room id to last seen seq; None joins the room without replay."""
+    replays = []
+    user_id = session_registry.user_for(sid)
+    for room_id, last_seq in positions.items():
+        if not await room_members.is_member(room_id, user_id):
+            logging.warning(f"Socket {sid} refused room {room_id}")
+            continue
+        await sio.enter_room(sid, room_id)
+        session_registry.join(sid, room_id)
+        if isinstance(last_seq, int):
+            replays.append(find_missed_messages(room_id, last_seq))
+    if replays:
+        rooms = await asyncio.gather(*replays)
+        await sio.emit('missed_messages', socket_payload({'rooms': rooms}), room=sid)
 
 @sio.event
 async def authenticate(sid, data):
-    user_id = data.get('user_id')
-    if user_id:
-        connected_users[user_id] = sid
-        await sio.emit('authenticated', {'user_id': user_id}, room=sid)
-        logging.info(f"User {user_id} authenticated with socket {sid}")
+    """Bind the socket to the user of data['token']; without a token the socket must
+    have been authenticated on connect. A claimed user_id is never trusted."""
+    token = data.get('token')
+    if token:
+        user = await authenticate_token(token)
+        user_id = user["id"] if user else None
+        if user_id:
+            previous_user_id = session_registry.user_for(sid)
+            session_registry.authenticate(sid, user_id)
+            await publish_presence(user_id)
+            if previous_user_id and previous_user_id != user_id:
+                await publish_presence(previous_user_id)
+    else:
+        user_id = session_registry.user_for(sid)
+    if not user_id:
+        await sio.emit('unauthorized', {'detail': 'Could not validate credentials'}, room=sid)
+        logging.warning(f"Socket {sid} failed to authenticate")
+        return
+    await sio.emit('authenticated', {'user_id': user_id}, room=sid)
+    logging.info(f"User {user_id} authenticated with socket {sid}")
+    # Reconnecting clients may resume all their open rooms at once
+    if isinstance(data.get('rooms'), dict):
+        await resume_rooms(sid, data['rooms'])
 
 @sio.event
 async def join_room(sid, data):
     room_id = data.get('room_id')
-    await sio.enter_room(sid, room_id)
+    await resume_rooms(sid, {room_id: data.get('last_seq')})
     logging.info(f"Socket {sid} joined room {room_id}")
 
 @sio.event
 async def leave_room(sid, data):
     room_id = data.get('room_id')
     await sio.leave_room(sid, room_id)
+    session_registry.leave(sid, room_id)
     logging.info(f"Socket {sid} left room {room_id}")
 
 @sio.event
 async def send_message(sid, data):
     room_id = data.get('room_id')
-    sender_id = data.get('sender_id')
+    sender_id = session_registry.user_for(sid)
     message_text = data.get('message')
     
-    # Save to database
-    message = Message(
-        chat_room_id=room_id,
-        sender_id=sender_id,
-        message=message_text
-    )
-    await db.messages.insert_one(message.dict())
+    if not message_text or not await room_members.is_member(room_id, sender_id):
+        logging.warning(f"Message from socket {sid} to room {room_id} dropped")
+        return
     
-    # Update room last message time
-    await db.chat_rooms.update_one(
-        {"id": room_id},
-        {"$set": {"last_message_at": datetime.utcnow()}}
-    )
+    # Save to database; a message already sent over REST with the same
+    # client_message_id is not stored twice but is still broadcast
+    try:
+        message, _ = await create_message(
+            room_id, sender_id, message_text, data.get('client_message_id'), write_behind=SOCKET_WRITE_BEHIND
+        )
+    except HTTPException:
+        logging.warning(f"Message for unknown room {room_id} dropped")
+        return
     
     # Broadcast to room
-    message_dict = message.dict()
-    message_dict.pop("_id", None)
-    await sio.emit('new_message', message_dict, room=room_id)
+    await sio.emit('new_message', socket_payload(message), room=room_id)
     logging.info(f"Message sent to room {room_id}")
 
+TYPING_WINDOW = float(os.environ.get("TYPING_WINDOW", "1.0"))  # Seconds between state changes sent per (room, user)
+TYPING_TTL = float(os.environ.get("TYPING_TTL", "5.0"))  # Typing state expires without a refresh
+
+class TypingCoalescer:
+    """Turns a stream of per-keystroke typing events into state changes: at most one
+    user_typing emit per (room, user) per window, no repeats of the current state,
+    and a typing state that is not refreshed within the TTL expires to not typing"""
+
+    def __init__(self, window: float, ttl: float):
+        self.window = window
+        self.ttl = ttl
+        self.states: Dict[tuple, dict] = {}
+        self.stats = {"received": 0, "emitted": 0}
+        # Settles started by timers, kept referenced until they finish
+        self.tasks = set()
+
+    async def update(self, room_id: str, user_id: str, is_typing: bool, sid: str):
+        self.stats["received"] += 1
+        now = asyncio.get_running_loop().time()
+        state = self.states.setdefault((room_id, user_id), {
+            "emitted": False, "emitted_at": float("-inf"), "expires_at": now, "timer": None
+        })
+        state["wanted"] = bool(is_typing)
+        state["sid"] = sid
+        if is_typing:
+            state["expires_at"] = now + self.ttl
+        await self._settle((room_id, user_id))
+
+    async def clear_sid(self, sid: str):
+        """The socket is gone: end the typing state of everything it was typing in"""
+        for key, state in list(self.states.items()):
+            if state["sid"] == sid:
+                state["wanted"] = False
+                await self._settle(key)
+
+    def metrics(self) -> dict:
+        return {"active": len(self.states), **self.stats}
+
+    def _schedule(self, delay: float, key: tuple):
+        return asyncio.get_running_loop().call_later(delay, self._start_settle, key)
+
+    def _start_settle(self, key: tuple):
+        task = asyncio.ensure_future(self._settle(key))
+        self.tasks.add(task)
+        task.add_done_callback(self._settle_done)
+
+    def _settle_done(self, task: asyncio.Task):
+        self.tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logging.error(f"Typing state update failed: {task.exception()}")
+
+    async def _settle(self, key: tuple):
+        state = self.states.get(key)
+        if state is None:
+            return
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        if state["timer"] is not None:
+            state["timer"].cancel()
+            state["timer"] = None
+        if state["wanted"] and now >= state["expires_at"]:
+            state["wanted"] = False
+
+        if state["wanted"] != state["emitted"]:
+            wait = state["emitted_at"] + self.window - now
+            if wait > 0:
+                state["timer"] = self._schedule(wait, key)
+                return
+            state["emitted"] = state["wanted"]
+            state["emitted_at"] = now
+            self.stats["emitted"] += 1
+            room_id, user_id = key
+            await sio.emit('user_typing', {
+                'user_id': user_id,
+                'is_typing': state["emitted"]
+            }, room=room_id, skip_sid=state["sid"])
+
+        if state["emitted"]:
+            state["timer"] = self._schedule(state["expires_at"] - now, key)
+        elif now < state["emitted_at"] + self.window:
+            # Remember the last change until the window has passed
+            state["timer"] = self._schedule(state["emitted_at"] + self.window - now, key)
+        elif self.states.get(key) is state:
+            del self.states[key]
+
+typing_coalescer = TypingCoalescer(TYPING_WINDOW, TYPING_TTL)
+
 @sio.event
 async def typing(sid, data):
     room_id = data.get('room_id')
-    user_id = data.get('user_id')
+    user_id = session_registry.user_for(sid)
     is_typing = data.get('is_typing')
     
-    await sio.emit('user_typing', {
-        'user_id': user_id,
-        'is_typing': is_typing
-    }, room=room_id, skip_sid=sid)
+    if not await room_members.is_member(room_id, user_id):
+        return
+    await typing_coalescer.update(room_id, user_id, is_typing, sid)
 
 @sio.event
 async def mark_read(sid, data):
     room_id = data.get('room_id')
-    user_id = data.get('user_id')
+    user_id = session_registry.user_for(sid)
+    
+    if not await room_members.is_member(room_id, user_id):
+        return
     
     # Mark messages as read
-    await db.messages.update_many(
-        {"chat_room_id": room_id, "sender_id": {"$ne": user_id}},
-        {"$set": {"is_read": True}}
-    )
+    await mark_room_read(room_id, user_id)
     
     await sio.emit('messages_read', {'room_id': room_id}, room=room_id)
 
+# MessagePack clients get the same event handlers
+if SOCKETIO_MSGPACK:
+    for event, handler in sio.handlers["/"].items():
+        sio_msgpack.on(event, handler)
+
 # ==================== INCLUDE ROUTER ====================
 
 app.include_router(api_router)
@@ -2747,6 +5043,7 @@ app.add_middleware(
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Before-Cursor", "X-After-Cursor", "X-Has-More", "X-Sync-Since", "ETag", "Content-Range", "Accept-Ranges"],
 )
 
 # Configure logging
@@ -2756,6 +5053,55 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@app.on_event("startup")
+async def startup_indexes():
+    await ensure_indexes(reconcile=INDEX_RECONCILE_ON_STARTUP)
+
+@app.on_event("startup")
+async def startup_message_write_buffer():
+    if SOCKET_WRITE_BEHIND:
+        message_write_buffer.start()
+
+@app.on_event("startup")
+async def startup_presence_heartbeat():
+    if SOCKETIO_PUBSUB == "mongo":
+        asyncio.create_task(presence_heartbeat())
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    # Buffered socket messages must reach the database before the client closes
+    await message_write_buffer.close()
+    if SOCKETIO_PUBSUB == "mongo":
+        await db.socket_presence.delete_many({"worker_id": WORKER_ID})
     client.close()
+
+@app.on_event("shutdown")
+async def shutdown_media_derivation():
+    shutdown_derivation_pool()
+
+@app.on_event("shutdown")
+async def shutdown_password_hasher():
+    password_hasher.shutdown()
+
+# ==================== MAINTENANCE COMMANDS ====================
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Raya backend maintenance commands")
+    parser.add_argument(
+        "command",
+        choices=["ensure-indexes", "index-report", "migrate-media", "derive-media", "backfill-last-messages"]
+    )
+    args = parser.parse_args()
+
+    if args.command == "ensure-indexes":
+        asyncio.run(ensure_indexes())
+    elif args.command == "index-report":
+        asyncio.run(print_index_report())
+    elif args.command == "migrate-media":
+        asyncio.run(migrate_inline_media())
+    elif args.command == "derive-media":
+        asyncio.run(backfill_media_variants())
+    elif args.command == "backfill-last-messages":
+        asyncio.run(backfill_last_messages())
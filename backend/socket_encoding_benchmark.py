@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Socket.IO packet encoding benchmark: JSON vs MessagePack
+Compares bytes on the wire and encode/decode time of the chat event payloads
+sent by server.py. Run with: python socket_encoding_benchmark.py
+"""
+
+import timeit
+import uuid
+from datetime import datetime, timedelta
+
+from socketio import packet
+from socketio.msgpack_packet import MsgPackPacket
+
+ROOM_ID = str(uuid.uuid4())
+SENDER_ID = str(uuid.uuid4())
+
+def chat_message(seq, text):
+    # Same shape as socket_payload(message) in server.py
+    return {
+        "id": str(uuid.uuid4()),
+        "chat_room_id": ROOM_ID,
+        "sender_id": SENDER_ID,
+        "message": text,
+        "is_read": False,
+        "created_at": (datetime(2025, 1, 1) + timedelta(seconds=seq)).isoformat(),
+        "seq": seq,
+        "client_message_id": f"{SENDER_ID}-{seq}"
+    }
+
+EVENTS = {
+    "new_message (short)": ["new_message", chat_message(42, "Are you free on Saturday?")],
+    "new_message (long)": ["new_message", chat_message(43, "We can offer a 2 hour slot from 8pm, sound system included. " * 6)],
+    "user_typing": ["user_typing", {"user_id": SENDER_ID, "is_typing": True}],
+    "messages_read": ["messages_read", {"room_id": ROOM_ID}],
+    "missed_messages (50)": ["missed_messages", {"rooms": [{
+        "room_id": ROOM_ID,
+        "messages": [chat_message(seq, f"Message number {seq}") for seq in range(50)],
+        "has_more": False
+    }]}],
+}
+
+ENCODINGS = {
+    "json": packet.Packet,
+    "msgpack": MsgPackPacket,
+}
+
+def measure(packet_class, data, number):
+    pkt = packet_class(packet.EVENT, namespace="/", data=data)
+    encoded = pkt.encode()
+    encode_time = timeit.timeit(lambda: packet_class(packet.EVENT, namespace="/", data=data).encode(), number=number)
+    decode_time = timeit.timeit(lambda: packet_class(encoded_packet=encoded), number=number)
+    return len(encoded), encode_time / number * 1e6, decode_time / number * 1e6
+
+def main(number=20000):
+    print(f"{'event':<22} {'encoding':<8} {'bytes':>7} {'encode us':>10} {'decode us':>10}")
+    for name, data in EVENTS.items():
+        results = {encoding: measure(packet_class, data, number if "50" not in name else number // 50)
+                   for encoding, packet_class in ENCODINGS.items()}
+        for encoding, (size, encode_us, decode_us) in results.items():
+            print(f"{name:<22} {encoding:<8} {size:>7} {encode_us:>10.2f} {decode_us:>10.2f}")
+        saved = 1 - results["msgpack"][0] / results["json"][0]
+        print(f"{'':<22} {'saved':<8} {saved:>7.0%}")
+
+if __name__ == "__main__":
+    main()
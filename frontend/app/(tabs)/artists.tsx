@@ -14,6 +14,8 @@ import {
 } from 'react-native';
 import { useRouter } from 'expo-router';
 import { theme, BANGALORE_LOCATIONS } from '../../utils/theme';
+import { usePagedList } from '../../utils/pagination';
+import { mediaUri } from '../../utils/media';
 import { Ionicons } from '@expo/vector-icons';
 import axios from 'axios';
 import { LinearGradient } from 'expo-linear-gradient';
@@ -26,7 +28,7 @@ const BACKEND_URL = process.env.EXPO_PUBLIC_BACKEND_URL || '';
 
 export default function ArtistsScreen() {
   const { user, token } = useAuth();
-  const [artists, setArtists] = useState([]);
+  const { items: artists, reload: reloadArtists, loadMore } = usePagedList(`${BACKEND_URL}/api/artists`);
   const [filteredArtists, setFilteredArtists] = useState([]);
   const [searchQuery, setSearchQuery] = useState('');
   const [refreshing, setRefreshing] = useState(false);
@@ -155,20 +157,19 @@ export default function ArtistsScreen() {
 
   const fetchArtists = async () => {
     try {
-      const response = await axios.get(`${BACKEND_URL}/api/artists`);
-      const sorted = response.data.sort((a: any, b: any) => {
-        if (a.is_featured && !b.is_featured) return -1;
-        if (!a.is_featured && b.is_featured) return 1;
-        return b.rating - a.rating;
-      });
-      setArtists(sorted);
+      await reloadArtists();
     } catch (error) {
       console.error('Error fetching artists:', error);
     }
   };
 
   const applyFilters = () => {
-    let filtered = [...artists];
+    // Featured first across the pages loaded so far
+    let filtered = [...artists].sort((a: any, b: any) => {
+      if (a.is_featured && !b.is_featured) return -1;
+      if (!a.is_featured && b.is_featured) return 1;
+      return b.rating - a.rating;
+    });
     
     // Search filter
     if (searchQuery.trim()) {
@@ -247,9 +248,9 @@ export default function ArtistsScreen() {
         
         <View style={styles.cardContent}>
           <View style={styles.avatarContainer}>
-            {item.media_gallery && item.media_gallery[0] ? (
+            {item.cover_image_url ? (
               <Image
-                source={{ uri: item.media_gallery[0] }}
+                source={{ uri: mediaUri(item.cover_image_url) }}
                 style={styles.avatar}
               />
             ) : (
@@ -354,6 +355,8 @@ export default function ArtistsScreen() {
         data={filteredArtists}
         renderItem={renderArtist}
         keyExtractor={(item: any) => item.id}
+        onEndReached={loadMore}
+        onEndReachedThreshold={0.5}
         contentContainerStyle={styles.listContent}
         refreshControl={
           <RefreshControl refreshing={refreshing} onRefresh={onRefresh} tintColor={theme.colors.secondary} />
@@ -11,16 +11,19 @@ import {
 import { useRouter } from 'expo-router';
 import { useAuth } from '../../contexts/AuthContext';
 import { theme } from '../../utils/theme';
+import { usePagedList } from '../../utils/pagination';
+import { mediaUri } from '../../utils/media';
 import { Ionicons } from '@expo/vector-icons';
 import { LinearGradient } from 'expo-linear-gradient';
-import axios from 'axios';
 
 const BACKEND_URL = process.env.EXPO_PUBLIC_BACKEND_URL || '';
 
 export default function MyChatsScreen() {
   const { user, token } = useAuth();
   const router = useRouter();
-  const [chatRooms, setChatRooms] = useState([]);
+  const { items: chatRooms, reload: reloadChatRooms, loadMore } = usePagedList(`${BACKEND_URL}/api/chat/rooms`, {
+    headers: { Authorization: `Bearer ${token}` },
+  });
   const [refreshing, setRefreshing] = useState(false);
   const [loading, setLoading] = useState(true);
 
@@ -30,10 +33,7 @@ export default function MyChatsScreen() {
 
   const fetchChatRooms = async () => {
     try {
-      const response = await axios.get(`${BACKEND_URL}/api/chat/rooms`, {
-        headers: { Authorization: `Bearer ${token}` },
-      });
-      setChatRooms(response.data);
+      await reloadChatRooms();
     } catch (error) {
       console.error('Error fetching chat rooms:', error);
     } finally {
@@ -56,7 +56,7 @@ export default function MyChatsScreen() {
       
       return {
         name: otherArtistProfile?.stage_name || 'Artist',
-        image: otherArtistProfile?.profile_image,
+        image: mediaUri(otherArtistProfile?.profile_image_url),
         type: 'artist',
         isArtistChat: true,
         isPartnerChat: false,
@@ -71,7 +71,7 @@ export default function MyChatsScreen() {
       
       return {
         name: otherPartnerProfile?.brand_name || 'Partner',
-        image: otherPartnerProfile?.profile_image,
+        image: mediaUri(otherPartnerProfile?.profile_image_url),
         type: 'partner',
         isArtistChat: false,
         isPartnerChat: true,
@@ -83,7 +83,7 @@ export default function MyChatsScreen() {
       const profile = room.provider_profile;
       return {
         name: profile?.stage_name || profile?.brand_name || 'Provider',
-        image: profile?.profile_image,
+        image: mediaUri(profile?.profile_image_url),
         type: room.provider_type,
         isArtistChat: false,
         isPartnerChat: false,
@@ -95,7 +95,7 @@ export default function MyChatsScreen() {
         const profile = room.provider_profile;
         return {
           name: profile?.stage_name || profile?.brand_name || 'User',
-          image: profile?.profile_image,
+          image: mediaUri(profile?.profile_image_url),
           type: room.provider_type,
           isArtistChat: false,
           isPartnerChat: false,
@@ -105,7 +105,7 @@ export default function MyChatsScreen() {
         const profile = room.initiator_profile;
         return {
           name: profile?.stage_name || profile?.brand_name || 'User',
-          image: profile?.profile_image,
+          image: mediaUri(profile?.profile_image_url),
           type: profile?.stage_name ? 'artist' : 'partner',
           isArtistChat: false,
           isPartnerChat: false,
@@ -115,7 +115,7 @@ export default function MyChatsScreen() {
         const profile = room.venue_profile;
         return {
           name: profile?.venue_name || 'Venue',
-          image: profile?.profile_image,
+          image: mediaUri(profile?.profile_image_url),
           type: 'venue',
           isArtistChat: false,
           isPartnerChat: false,
@@ -216,6 +216,8 @@ export default function MyChatsScreen() {
         data={chatRooms}
         renderItem={renderChatRoom}
         keyExtractor={(item: any) => item.id}
+        onEndReached={loadMore}
+        onEndReachedThreshold={0.5}
         contentContainerStyle={styles.listContent}
         refreshControl={
           <RefreshControl refreshing={refreshing} onRefresh={onRefresh} tintColor={theme.colors.secondary} />
@@ -13,9 +13,9 @@ import {
 import { useRouter } from 'expo-router';
 import { useAuth } from '../../contexts/AuthContext';
 import { theme } from '../../utils/theme';
+import { getPage } from '../../utils/pagination';
 import { Ionicons } from '@expo/vector-icons';
 import { LinearGradient } from 'expo-linear-gradient';
-import axios from 'axios';
 
 const { width } = Dimensions.get('window');
 const BACKEND_URL = process.env.EXPO_PUBLIC_BACKEND_URL || '';
@@ -98,17 +98,15 @@ export default function HomeScreen() {
   });
 
   const fetchData = async () => {
+    const featuredParams = { featured_only: true, limit: 3 };
     try {
       const [artistsRes, partnersRes] = await Promise.all([
-        axios.get(`${BACKEND_URL}/api/artists`),
-        axios.get(`${BACKEND_URL}/api/partners`),
+        getPage(`${BACKEND_URL}/api/artists`, { params: featuredParams }),
+        getPage(`${BACKEND_URL}/api/partners`, { params: featuredParams }),
       ]);
-      
-      const featuredArtists = artistsRes.data.filter((a: any) => a.is_featured);
-      const featuredPartners = partnersRes.data.filter((p: any) => p.is_featured);
-      
-      setArtists(featuredArtists.slice(0, 3));
-      setPartners(featuredPartners.slice(0, 3));
+
+      setArtists(artistsRes.data);
+      setPartners(partnersRes.data);
     } catch (error) {
       console.error('Error fetching data:', error);
     }
@@ -12,6 +12,8 @@ import {
 } from 'react-native';
 import { useRouter } from 'expo-router';
 import { theme } from '../../utils/theme';
+import { usePagedList } from '../../utils/pagination';
+import { mediaUri } from '../../utils/media';
 import { Ionicons } from '@expo/vector-icons';
 import axios from 'axios';
 import { LinearGradient } from 'expo-linear-gradient';
@@ -21,7 +23,7 @@ const BACKEND_URL = process.env.EXPO_PUBLIC_BACKEND_URL || '';
 
 export default function PartnersScreen() {
   const { user, token } = useAuth();
-  const [partners, setPartners] = useState([]);
+  const { items: partners, reload: reloadPartners, loadMore } = usePagedList(`${BACKEND_URL}/api/partners`);
   const [filteredPartners, setFilteredPartners] = useState([]);
   const [searchQuery, setSearchQuery] = useState('');
   const [refreshing, setRefreshing] = useState(false);
@@ -40,26 +42,26 @@ export default function PartnersScreen() {
 
   const fetchPartners = async () => {
     try {
-      const response = await axios.get(`${BACKEND_URL}/api/partners`);
-      const sorted = response.data.sort((a: any, b: any) => {
-        if (a.is_featured && !b.is_featured) return -1;
-        if (!a.is_featured && b.is_featured) return 1;
-        return b.rating - a.rating;
-      });
-      setPartners(sorted);
+      await reloadPartners();
     } catch (error) {
       console.error('Error fetching partners:', error);
     }
   };
 
   const filterPartners = () => {
+    // Featured first across the pages loaded so far
+    const sorted = [...partners].sort((a: any, b: any) => {
+      if (a.is_featured && !b.is_featured) return -1;
+      if (!a.is_featured && b.is_featured) return 1;
+      return b.rating - a.rating;
+    });
     if (!searchQuery.trim()) {
-      setFilteredPartners(partners);
+      setFilteredPartners(sorted);
       return;
     }
     
     const query = searchQuery.toLowerCase();
-    const filtered = partners.filter((partner: any) =>
+    const filtered = sorted.filter((partner: any) =>
       partner.brand_name.toLowerCase().includes(query) ||
       partner.service_type.toLowerCase().includes(query)
     );
@@ -121,9 +123,9 @@ export default function PartnersScreen() {
       
       <View style={styles.cardContent}>
         <View style={styles.logoContainer}>
-          {item.profile_image ? (
+          {item.profile_image_url ? (
             <Image
-              source={{ uri: item.profile_image }}
+              source={{ uri: mediaUri(item.profile_image_url) }}
               style={styles.logo}
             />
           ) : (
@@ -193,6 +195,8 @@ export default function PartnersScreen() {
         data={filteredPartners}
         renderItem={renderPartner}
         keyExtractor={(item: any) => item.id}
+        onEndReached={loadMore}
+        onEndReachedThreshold={0.5}
         contentContainerStyle={styles.listContent}
         refreshControl={
           <RefreshControl refreshing={refreshing} onRefresh={onRefresh} tintColor={theme.colors.secondary} />
@@ -12,6 +12,8 @@ import {
 import { useRouter } from 'expo-router';
 import { useAuth } from '../../contexts/AuthContext';
 import { theme } from '../../utils/theme';
+import { usePagedList } from '../../utils/pagination';
+import { mediaUri } from '../../utils/media';
 import { Ionicons } from '@expo/vector-icons';
 import axios from 'axios';
 import { LinearGradient } from 'expo-linear-gradient';
@@ -20,7 +22,13 @@ const BACKEND_URL = process.env.EXPO_PUBLIC_BACKEND_URL || '';
 
 export default function WishlistScreen() {
   const { user, token } = useAuth();
-  const [wishlist, setWishlist] = useState([]);
+  const {
+    items: wishlist,
+    setItems: setWishlist,
+    reload: reloadWishlist,
+    loadMore,
+    hasMore,
+  } = usePagedList(`${BACKEND_URL}/api/wishlist`, { headers: { Authorization: `Bearer ${token}` } });
   const [refreshing, setRefreshing] = useState(false);
   const router = useRouter();
 
@@ -32,10 +40,7 @@ export default function WishlistScreen() {
 
   const fetchWishlist = async () => {
     try {
-      const response = await axios.get(`${BACKEND_URL}/api/wishlist`, {
-        headers: { Authorization: `Bearer ${token}` },
-      });
-      setWishlist(response.data);
+      await reloadWishlist();
     } catch (error) {
       console.error('Error fetching wishlist:', error);
     }
@@ -46,7 +51,7 @@ export default function WishlistScreen() {
       await axios.delete(`${BACKEND_URL}/api/wishlist/${profileId}`, {
         headers: { Authorization: `Bearer ${token}` },
       });
-      setWishlist(wishlist.filter((item: any) => item.profile.id !== profileId));
+      setWishlist((prev) => prev.filter((item: any) => item.profile.id !== profileId));
     } catch (error) {
       Alert.alert('Error', 'Failed to remove from wishlist');
     }
@@ -69,9 +74,9 @@ export default function WishlistScreen() {
       >
         <View style={styles.cardContent}>
           <View style={styles.imageContainer}>
-            {profile.profile_image ? (
+            {profile.profile_image_url ? (
               <Image
-                source={{ uri: profile.profile_image }}
+                source={{ uri: mediaUri(profile.profile_image_url) }}
                 style={styles.image}
               />
             ) : (
@@ -153,13 +158,15 @@ export default function WishlistScreen() {
         style={styles.header}
       >
         <Text style={styles.title}>My Wishlist</Text>
-        <Text style={styles.subtitle}>{wishlist.length} saved</Text>
+        <Text style={styles.subtitle}>{wishlist.length}{hasMore ? '+' : ''} saved</Text>
       </LinearGradient>
 
       <FlatList
         data={wishlist}
         renderItem={renderItem}
         keyExtractor={(item: any) => item.wishlist_id}
+        onEndReached={loadMore}
+        onEndReachedThreshold={0.5}
         contentContainerStyle={styles.listContent}
         refreshControl={
           <RefreshControl refreshing={refreshing} onRefresh={onRefresh} tintColor={theme.colors.secondary} />
@@ -14,6 +14,7 @@ import {
 import { useAuth } from '../contexts/AuthContext';
 import { useRouter } from 'expo-router';
 import { theme } from '../utils/theme';
+import { isNearEnd, usePagedList } from '../utils/pagination';
 import { Ionicons } from '@expo/vector-icons';
 import { LinearGradient } from 'expo-linear-gradient';
 import axios from 'axios';
@@ -26,10 +27,16 @@ export default function AdminDashboard() {
   const { user, token } = useAuth();
   const router = useRouter();
   const [activeTab, setActiveTab] = useState<TabType>('artists');
-  const [artists, setArtists] = useState<any[]>([]);
-  const [partners, setPartners] = useState<any[]>([]);
-  const [chats, setChats] = useState<any[]>([]);
-  const [reports, setReports] = useState<any[]>([]);
+  const adminConfig = { headers: { Authorization: `Bearer ${token}` } };
+  const artistList = usePagedList(`${BACKEND_URL}/api/artists`);
+  const partnerList = usePagedList(`${BACKEND_URL}/api/partners`);
+  const chatList = usePagedList(`${BACKEND_URL}/api/admin/chats`, adminConfig);
+  const reportList = usePagedList(`${BACKEND_URL}/api/admin/reports`, adminConfig);
+  const lists = { artists: artistList, partners: partnerList, chats: chatList, reports: reportList };
+  const artists = artistList.items;
+  const partners = partnerList.items;
+  const chats = chatList.items;
+  const reports = reportList.items;
   const [loading, setLoading] = useState(false);
   const [refreshing, setRefreshing] = useState(false);
   const [showAddModal, setShowAddModal] = useState(false);
@@ -52,23 +59,7 @@ export default function AdminDashboard() {
   const fetchData = async () => {
     setLoading(true);
     try {
-      if (activeTab === 'artists') {
-        const response = await axios.get(`${BACKEND_URL}/api/artists`);
-        setArtists(response.data);
-      } else if (activeTab === 'partners') {
-        const response = await axios.get(`${BACKEND_URL}/api/partners`);
-        setPartners(response.data);
-      } else if (activeTab === 'chats') {
-        const response = await axios.get(`${BACKEND_URL}/api/admin/chats`, {
-          headers: { Authorization: `Bearer ${token}` },
-        });
-        setChats(response.data);
-      } else if (activeTab === 'reports') {
-        const response = await axios.get(`${BACKEND_URL}/api/admin/reports`, {
-          headers: { Authorization: `Bearer ${token}` },
-        });
-        setReports(response.data);
-      }
+      await lists[activeTab].reload();
     } catch (error) {
       console.error('Error fetching data:', error);
     } finally {
@@ -413,6 +404,10 @@ export default function AdminDashboard() {
       {/* Content */}
       <ScrollView
         style={styles.content}
+        onScroll={({ nativeEvent }) => {
+          if (isNearEnd(nativeEvent)) lists[activeTab].loadMore();
+        }}
+        scrollEventThrottle={400}
         refreshControl={<RefreshControl refreshing={refreshing} onRefresh={handleRefresh} tintColor={theme.colors.secondary} />}
       >
         {loading && !refreshing ? (
@@ -12,6 +12,8 @@ import {
 import { useRouter, useLocalSearchParams } from 'expo-router';
 import { useAuth } from '../../contexts/AuthContext';
 import { theme } from '../../utils/theme';
+import { getPage } from '../../utils/pagination';
+import { mediaUri } from '../../utils/media';
 import { Ionicons } from '@expo/vector-icons';
 import { LinearGradient } from 'expo-linear-gradient';
 import axios from 'axios';
@@ -27,16 +29,19 @@ const BACKEND_URL = process.env.EXPO_PUBLIC_BACKEND_URL || '';
 const DAYS_OF_WEEK = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday'];
 const MediaItem = ({
   media,
+  kind,
   index,
   currentPlaying,
   setCurrentPlaying,
 }: {
   media: string;
+  kind?: string;
   index: number;
   currentPlaying: number | null;
   setCurrentPlaying: (i: number | null) => void;
 }) => {
   const isVideo =
+    kind === "video" ||
     media.startsWith("data:video") ||
     /\.(mp4|mov|avi|webm)$/i.test(media);
 
@@ -285,7 +290,7 @@ export default function ArtistDetailScreen() {
 
   const fetchReviews = async () => {
     try {
-      const response = await axios.get(`${BACKEND_URL}/api/reviews/${id}`);
+      const response = await getPage(`${BACKEND_URL}/api/reviews/${id}`, { params: { limit: 3 } });
       setReviews(response.data);
     } catch (error) {
       console.error('Error fetching reviews:', error);
@@ -294,11 +299,10 @@ export default function ArtistDetailScreen() {
 
   const checkWishlist = async () => {
     try {
-      const response = await axios.get(`${BACKEND_URL}/api/wishlist`, {
+      const response = await axios.get(`${BACKEND_URL}/api/wishlist/${id}`, {
         headers: { Authorization: `Bearer ${token}` },
       });
-      const inWishlist = response.data.some((item: any) => item.profile.id === id);
-      setIsInWishlist(inWishlist);
+      setIsInWishlist(response.data.in_wishlist);
     } catch (error) {
       console.error('Error checking wishlist:', error);
     }
@@ -408,8 +412,8 @@ export default function ArtistDetailScreen() {
           </LinearGradient>
 
           <View style={styles.profileImageContainer}>
-            {artist.profile_image ? (
-              <Image source={{ uri: artist.profile_image }} style={styles.profileImage} />
+            {artist.profile_image_url ? (
+              <Image source={{ uri: mediaUri(artist.profile_image_url) }} style={styles.profileImage} />
             ) : (
               <View style={styles.profileImagePlaceholder}>
                 <Ionicons name="person" size={80} color={theme.colors.textSecondary} />
@@ -460,7 +464,7 @@ export default function ArtistDetailScreen() {
           </View>
 
           {/* MEDIA GALLERY - BIGGER DISPLAY */}
-            {artist.media_gallery && artist.media_gallery.length > 0 && (
+            {artist.media_gallery_urls && artist.media_gallery_urls.length > 0 && (
               <View style={styles.mediaSection}>
                 <View style={styles.mediaSectionHeader}>
                   <Ionicons name="images" size={28} color={theme.colors.secondary} />
@@ -472,10 +476,11 @@ export default function ArtistDetailScreen() {
                   showsHorizontalScrollIndicator={false}
                   style={styles.mediaScroll}
                 >
-                  {artist.media_gallery.map((media: string, index: number) => (
+                  {artist.media_gallery_urls.map((url: string, index: number) => (
                     <MediaItem
                       key={index}
-                      media={media}
+                      media={mediaUri(url) || ''}
+                      kind={artist.media_gallery_kinds?.[index]}
                       index={index}
                       currentPlaying={currentPlaying}
                       setCurrentPlaying={setCurrentPlaying}
@@ -586,7 +591,7 @@ export default function ArtistDetailScreen() {
 
           {/* Reviews */}
           <View style={styles.section}>
-            <Text style={styles.sectionTitle}>Reviews ({reviews.length})</Text>
+            <Text style={styles.sectionTitle}>Reviews ({artist.review_count})</Text>
             {reviews.length > 0 ? (
               reviews.slice(0, 3).map((review: any) => (
                 <View key={review.id} style={styles.reviewCard}>
@@ -13,6 +13,7 @@ import {
 import { useRouter, useLocalSearchParams } from 'expo-router';
 import { useAuth } from '../../contexts/AuthContext';
 import { theme } from '../../utils/theme';
+import { getPage } from '../../utils/pagination';
 import { Ionicons } from '@expo/vector-icons';
 import { LinearGradient } from 'expo-linear-gradient';
 import axios from 'axios';
@@ -31,6 +32,7 @@ export default function ChatScreen() {
   const [showMenu, setShowMenu] = useState(false);
   const [collaboration, setCollaboration] = useState<any>(null);
   const socketRef = useRef<any>(null);
+  const lastSeqRef = useRef<number | null>(null);
   const flatListRef = useRef<any>(null);
 
   useEffect(() => {
@@ -52,24 +54,50 @@ export default function ChatScreen() {
     };
   }, [id]);
 
+  useEffect(() => {
+    const seqs = messages.map((msg) => msg.seq).filter((seq) => typeof seq === 'number');
+    if (seqs.length) {
+      lastSeqRef.current = Math.max(...seqs);
+    }
+  }, [messages]);
+
   const initializeSocket = () => {
     const socket = io(BACKEND_URL.replace('/api', ''), {
       transports: ['websocket'],
+      auth: { token },
     });
 
     socket.on('connect', () => {
       console.log('Socket connected');
-      socket.emit('authenticate', { user_id: user?.id });
-      socket.emit('join_room', { room_id: id });
+      socket.emit('authenticate', { token });
+      // On reconnect the server replays what we missed since lastSeqRef
+      socket.emit('join_room', { room_id: id, last_seq: lastSeqRef.current });
+    });
+
+    socket.on('missed_messages', (data: any) => {
+      const missed = data.rooms.flatMap((room: any) => room.messages);
+      setMessages((prev) => [...prev, ...missed.filter((message: any) => !prev.some((msg) => msg.id === message.id))]);
+      if (data.rooms.some((room: any) => room.has_more)) {
+        fetchMessages();
+      }
     });
 
     socket.on('new_message', (message: any) => {
-      setMessages((prev) => [...prev, message]);
+      // Our own messages come back over the socket too; keep one copy per id
+      setMessages((prev) => (prev.some((msg) => msg.id === message.id) ? prev : [...prev, message]));
       setTimeout(() => {
         flatListRef.current?.scrollToEnd();
       }, 100);
     });
 
+    socket.on('message_replaced', (data: any) => {
+      // A resend that was already stored under another id: keep the stored copy
+      setMessages((prev) => {
+        const others = prev.filter((msg) => msg.id !== data.replaced_id);
+        return others.some((msg) => msg.id === data.message.id) ? others : [...others, data.message];
+      });
+    });
+
     socket.on('user_typing', (data: any) => {
       // Handle typing indicator if needed
     });
@@ -79,13 +107,10 @@ export default function ChatScreen() {
 
   const fetchChatRoom = async () => {
     try {
-      const response = await axios.get(`${BACKEND_URL}/api/chat/rooms`, {
+      const response = await axios.get(`${BACKEND_URL}/api/chat/rooms/${id}`, {
         headers: { Authorization: `Bearer ${token}` },
       });
-      const room = response.data.find((r: any) => r.id === id);
-      if (room) {
-        setRoomInfo(room);
-      }
+      setRoomInfo(response.data);
     } catch (error) {
       console.error('Error fetching room:', error);
     }
@@ -114,6 +139,9 @@ export default function ChatScreen() {
     const messageText = inputText.trim();
     setInputText('');
 
+    // Sent over both HTTP and the socket; the server stores it once
+    const clientMessageId = `${user?.id}-${Date.now()}-${Math.random().toString(36).slice(2)}`;
+
     try {
       // Immediately add message to UI (optimistic update)
       const tempMessage = {
@@ -131,6 +159,7 @@ export default function ChatScreen() {
         {
           room_id: id,
           message: messageText,
+          client_message_id: clientMessageId,
         },
         {
           headers: { Authorization: `Bearer ${token}` },
@@ -138,8 +167,10 @@ export default function ChatScreen() {
       );
 
       // Update with actual message from server
-      setMessages((prev) => 
-        prev.map(msg => msg.id === tempMessage.id ? response.data : msg)
+      setMessages((prev) =>
+        prev.some((msg) => msg.id === response.data.id)
+          ? prev.filter((msg) => msg.id !== tempMessage.id)
+          : prev.map((msg) => (msg.id === tempMessage.id ? response.data : msg))
       );
 
       // Scroll to bottom
@@ -153,6 +184,7 @@ export default function ChatScreen() {
           room_id: id,
           sender_id: user?.id,
           message: messageText,
+          client_message_id: clientMessageId,
         });
       }
     } catch (error) {
@@ -276,14 +308,11 @@ export default function ChatScreen() {
 
   const fetchCollaboration = async () => {
     try {
-      const response = await axios.get(
-        `${BACKEND_URL}/api/collaborations`,
-        { headers: { Authorization: `Bearer ${token}` } }
-      );
-      
-      // Find collaboration for this chat room
-      const collab = response.data.find((c: any) => c.chat_room_id === id);
-      setCollaboration(collab || null);
+      const response = await getPage(`${BACKEND_URL}/api/collaborations`, {
+        headers: { Authorization: `Bearer ${token}` },
+        params: { chat_room_id: id, limit: 1 },
+      });
+      setCollaboration(response.data[0] || null);
     } catch (error) {
       console.log('Error fetching collaboration:', error);
     }
@@ -15,6 +15,7 @@ import {
 import { useRouter } from 'expo-router';
 import { useAuth } from '../contexts/AuthContext';
 import { theme } from '../utils/theme';
+import { mediaUri } from '../utils/media';
 import { Ionicons } from '@expo/vector-icons';
 import { LinearGradient } from 'expo-linear-gradient';
 import axios from 'axios';
@@ -24,6 +25,14 @@ import { Calendar } from 'react-native-calendars';
 const BACKEND_URL = process.env.EXPO_PUBLIC_BACKEND_URL || '';
 const DAYS_OF_WEEK = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday'];
 
+const galleryKinds = (profile: any): Record<string, string> => {
+  const kinds: Record<string, string> = {};
+  (profile.media_gallery || []).forEach((media: string, index: number) => {
+    kinds[media] = profile.media_gallery_kinds?.[index] || 'image';
+  });
+  return kinds;
+};
+
 export default function EditProfileScreen() {
   const { user, profile, token, refreshProfile } = useAuth();
   const router = useRouter();
@@ -50,6 +59,8 @@ export default function EditProfileScreen() {
 
   // Media gallery
   const [mediaGallery, setMediaGallery] = useState<string[]>([]);
+  // Kind of each stored gallery item by media id; new uploads are data URIs
+  const [mediaKinds, setMediaKinds] = useState<Record<string, string>>({});
 
   useEffect(() => {
     if (profile) {
@@ -78,10 +89,12 @@ export default function EditProfileScreen() {
         setLocations(profile.locations || []);
         setPressKit(profile.press_kit || '');
         setMediaGallery(profile.media_gallery || []);
+        setMediaKinds(galleryKinds(profile));
       } else if (user?.user_type === 'partner') {
         setBrandName(profile.brand_name || '');
         setServiceType(profile.service_type || '');
         setMediaGallery(profile.media_gallery || []);
+        setMediaKinds(galleryKinds(profile));
       } else if (user?.user_type === 'venue') {
         setVenueName(profile.venue_name || '');
       }
@@ -452,7 +465,7 @@ export default function EditProfileScreen() {
                 
                 <ScrollView horizontal showsHorizontalScrollIndicator={false} style={styles.mediaGallery}>
                   {mediaGallery.map((media, index) => {
-                    const isVideo = media.includes('data:video') || media.includes('.mp4') || media.includes('.mov') || media.includes(';uri,');
+                    const isVideo = mediaKinds[media] === 'video' || media.includes('data:video') || media.includes('.mp4') || media.includes('.mov') || media.includes(';uri,');
                     
                     return (
                       <View key={index} style={styles.mediaItem}>
@@ -463,7 +476,7 @@ export default function EditProfileScreen() {
                             <Text style={styles.videoSubLabel}>Tap to play</Text>
                           </View>
                         ) : (
-                          <Image source={{ uri: media }} style={styles.mediaImage} />
+                          <Image source={{ uri: mediaUri(media) }} style={styles.mediaImage} />
                         )}
                         <TouchableOpacity
                           style={styles.removeMediaButton}
@@ -537,7 +550,7 @@ export default function EditProfileScreen() {
                 
                 <ScrollView horizontal showsHorizontalScrollIndicator={false} style={styles.mediaGallery}>
                   {mediaGallery.map((media, index) => {
-                    const isVideo = media.includes('data:video') || media.includes('.mp4') || media.includes('.mov') || media.includes(';uri,');
+                    const isVideo = mediaKinds[media] === 'video' || media.includes('data:video') || media.includes('.mp4') || media.includes('.mov') || media.includes(';uri,');
                     
                     return (
                       <View key={index} style={styles.mediaItem}>
@@ -548,7 +561,7 @@ export default function EditProfileScreen() {
                             <Text style={styles.videoSubLabel}>Tap to play</Text>
                           </View>
                         ) : (
-                          <Image source={{ uri: media }} style={styles.mediaImage} />
+                          <Image source={{ uri: mediaUri(media) }} style={styles.mediaImage} />
                         )}
                         <TouchableOpacity
                           style={styles.removeMediaButton}
@@ -12,6 +12,8 @@ import {
 import { useRouter, useLocalSearchParams } from 'expo-router';
 import { useAuth } from '../../contexts/AuthContext';
 import { theme } from '../../utils/theme';
+import { getPage } from '../../utils/pagination';
+import { mediaUri } from '../../utils/media';
 import { Ionicons } from '@expo/vector-icons';
 import { LinearGradient } from 'expo-linear-gradient';
 import axios from 'axios';
@@ -22,16 +24,19 @@ const { width } = Dimensions.get('window');
 const BACKEND_URL = process.env.EXPO_PUBLIC_BACKEND_URL || '';
 const MediaItem = ({
   media,
+  kind,
   index,
   currentPlaying,
   setCurrentPlaying,
 }: {
   media: string;
+  kind?: string;
   index: number;
   currentPlaying: number | null;
   setCurrentPlaying: (i: number | null) => void;
 }) => {
   const isVideo =
+    kind === "video" ||
     media.startsWith("data:video") ||
     /\.(mp4|mov|avi|webm)$/i.test(media);
 
@@ -222,7 +227,7 @@ export default function PartnerDetailScreen() {
 
   const fetchReviews = async () => {
     try {
-      const response = await axios.get(`${BACKEND_URL}/api/reviews/${id}`);
+      const response = await getPage(`${BACKEND_URL}/api/reviews/${id}`, { params: { limit: 3 } });
       setReviews(response.data);
     } catch (error) {
       console.error('Error fetching reviews:', error);
@@ -231,11 +236,10 @@ export default function PartnerDetailScreen() {
 
   const checkWishlist = async () => {
     try {
-      const response = await axios.get(`${BACKEND_URL}/api/wishlist`, {
+      const response = await axios.get(`${BACKEND_URL}/api/wishlist/${id}`, {
         headers: { Authorization: `Bearer ${token}` },
       });
-      const inWishlist = response.data.some((item: any) => item.profile.id === id);
-      setIsInWishlist(inWishlist);
+      setIsInWishlist(response.data.in_wishlist);
     } catch (error) {
       console.error('Error checking wishlist:', error);
     }
@@ -324,8 +328,8 @@ export default function PartnerDetailScreen() {
           </LinearGradient>
 
           <View style={styles.profileImageContainer}>
-            {partner.profile_image ? (
-              <Image source={{ uri: partner.profile_image }} style={styles.profileImage} />
+            {partner.profile_image_url ? (
+              <Image source={{ uri: mediaUri(partner.profile_image_url) }} style={styles.profileImage} />
             ) : (
               <View style={styles.profileImagePlaceholder}>
                 <Ionicons name="briefcase" size={80} color={theme.colors.textSecondary} />
@@ -376,7 +380,7 @@ export default function PartnerDetailScreen() {
           </View>
 
          {/* MEDIA GALLERY - BIGGER DISPLAY */}
-            {partner.media_gallery && partner.media_gallery.length > 0 && (
+            {partner.media_gallery_urls && partner.media_gallery_urls.length > 0 && (
               <View style={styles.mediaSection}>
                 <View style={styles.mediaSectionHeader}>
                   <Ionicons name="images" size={28} color={theme.colors.secondary} />
@@ -388,10 +392,11 @@ export default function PartnerDetailScreen() {
                   showsHorizontalScrollIndicator={false}
                   style={styles.mediaScroll}
                 >
-                  {partner.media_gallery.map((media: string, index: number) => (
+                  {partner.media_gallery_urls.map((url: string, index: number) => (
                     <MediaItem
                       key={index}
-                      media={media}
+                      media={mediaUri(url) || ''}
+                      kind={partner.media_gallery_kinds?.[index]}
                       index={index}
                       currentPlaying={currentPlaying}
                       setCurrentPlaying={setCurrentPlaying}
@@ -414,7 +419,7 @@ export default function PartnerDetailScreen() {
 
           {/* Reviews */}
           <View style={styles.section}>
-            <Text style={styles.sectionTitle}>Reviews ({reviews.length})</Text>
+            <Text style={styles.sectionTitle}>Reviews ({partner.review_count})</Text>
             {reviews.length > 0 ? (
               reviews.slice(0, 3).map((review: any) => (
                 <View key={review.id} style={styles.reviewCard}>
@@ -0,0 +1,12 @@
+const BACKEND_URL = process.env.EXPO_PUBLIC_BACKEND_URL || '';
+
+const MEDIA_ID = /^[0-9a-f]{64}$/;
+
+// Media URLs returned by the API are relative (/api/media/...); stored media ids
+// map to the same route. Data URIs and absolute URLs are used as they are.
+export const mediaUri = (value?: string | null): string | undefined => {
+  if (!value) return undefined;
+  if (MEDIA_ID.test(value)) return `${BACKEND_URL}/api/media/${value}`;
+  if (value.startsWith('/')) return `${BACKEND_URL}${value}`;
+  return value;
+};
@@ -0,0 +1,65 @@
+import axios, { AxiosRequestConfig } from 'axios';
+import { useCallback, useRef, useState } from 'react';
+import { NativeScrollEvent } from 'react-native';
+
+// Items requested per page (the API default; MAX_PAGE_SIZE in the backend is 200)
+const PAGE_SIZE = 50;
+
+// List endpoints return one page at a time and point at the next one with the
+// X-Next-Cursor header.
+export const getPage = async (url: string, config: AxiosRequestConfig = {}, cursor?: string) => {
+  const response = await axios.get(url, {
+    ...config,
+    params: { limit: PAGE_SIZE, ...config.params, cursor },
+  });
+  const nextCursor: string | undefined = response.headers['x-next-cursor'];
+  return { data: response.data as any[], nextCursor };
+};
+
+// A list loaded page by page: reload() fetches the first page, loadMore() appends
+// the next one (wire it to FlatList onEndReached) and does nothing past the end.
+export const usePagedList = (url: string, config: AxiosRequestConfig = {}) => {
+  const [items, setItems] = useState<any[]>([]);
+  const [hasMore, setHasMore] = useState(false);
+  const [loadingMore, setLoadingMore] = useState(false);
+  const nextCursor = useRef<string | undefined>(undefined);
+  const loading = useRef(false);
+  // Bumped by reload() so that a page requested before it is dropped
+  const generation = useRef(0);
+  const configRef = useRef(config);
+  configRef.current = config;
+
+  const reload = useCallback(async () => {
+    const current = ++generation.current;
+    const page = await getPage(url, configRef.current);
+    if (current !== generation.current) return;
+    nextCursor.current = page.nextCursor;
+    setHasMore(!!page.nextCursor);
+    setItems(page.data);
+  }, [url]);
+
+  const loadMore = useCallback(async () => {
+    if (!nextCursor.current || loading.current) return;
+    const current = generation.current;
+    loading.current = true;
+    setLoadingMore(true);
+    try {
+      const page = await getPage(url, configRef.current, nextCursor.current);
+      if (current !== generation.current) return;
+      nextCursor.current = page.nextCursor;
+      setHasMore(!!page.nextCursor);
+      setItems((prev) => [...prev, ...page.data]);
+    } catch (error) {
+      console.error(`Error loading more from ${url}:`, error);
+    } finally {
+      loading.current = false;
+      setLoadingMore(false);
+    }
+  }, [url]);
+
+  return { items, setItems, reload, loadMore, hasMore, loadingMore };
+};
+
+// For lists rendered inside a ScrollView: true once the user has scrolled near the end
+export const isNearEnd = ({ layoutMeasurement, contentOffset, contentSize }: NativeScrollEvent) =>
+  layoutMeasurement.height + contentOffset.y >= contentSize.height - 200;
@@ -0,0 +1,9 @@
+import os
+import sys
+from pathlib import Path
+
+# server.py reads these at import time; the client it creates does not connect
+# until it is used, so unit tests run without a MongoDB server.
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "raya_test")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
@@ -0,0 +1,18 @@
+class FakeCollection:
+    """Answers find_one by exact match on the given fields, counting the queries"""
+
+    def __init__(self, documents):
+        self.documents = documents
+        self.queries = 0
+
+    async def find_one(self, query, projection=None):
+        self.queries += 1
+        for document in self.documents:
+            if all(document.get(field) == value for field, value in query.items()):
+                return dict(document)
+        return None
+
+
+class FakeDatabase:
+    def __init__(self, **collections):
+        self.__dict__.update(collections)
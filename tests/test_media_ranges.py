@@ -0,0 +1,39 @@
+import pytest
+from fastapi import HTTPException
+
+from server import parse_range_header
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("bytes=0-99", (0, 100)),
+    ("bytes=100-", (100, 1000)),
+    ("bytes=-100", (900, 1000)),
+    ("bytes=900-5000", (900, 1000)),
+    ("bytes=-5000", (0, 1000)),
+    ("bytes=5-5", (5, 6)),
+])
+def test_single_range(header, expected):
+    assert parse_range_header(header, 1000) == expected
+
+
+@pytest.mark.parametrize("header", [
+    None,
+    "",
+    "items=0-10",
+    "bytes=0-10,20-30",  # multi-range: whole body
+    "bytes=5-3",  # last-pos before first-pos is invalid, not unsatisfiable
+    "bytes=-",
+    "bytes=a-b",
+    "bytes=--3",
+    "bytes=1-2-3",
+])
+def test_ignored_range_sends_whole_body(header):
+    assert parse_range_header(header, 1000) is None
+
+
+@pytest.mark.parametrize("header", ["bytes=1000-", "bytes=2000-3000", "bytes=-0"])
+def test_unsatisfiable_range_is_416(header):
+    with pytest.raises(HTTPException) as exc:
+        parse_range_header(header, 1000)
+    assert exc.value.status_code == 416
+    assert exc.value.headers["Content-Range"] == "bytes */1000"
@@ -0,0 +1,47 @@
+import pytest
+
+from server import MEDIA_CONTENT_TYPES, media_safety_headers, sniff_media_type
+
+
+def ftyp(brand):
+    return b"\x00\x00\x00\x18ftyp" + brand + b"\x00\x00\x00\x00"
+
+
+@pytest.mark.parametrize("head, content_type", [
+    (b"\xff\xd8\xff\xe0\x00\x10JFIF", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n\x00\x00\x00\x0dIHDR", "image/png"),
+    (b"GIF89a\x01\x00\x01\x00", "image/gif"),
+    (b"RIFF\x24\x00\x00\x00WEBPVP8 ", "image/webp"),
+    (b"\x1a\x45\xdf\xa3\x9f\x42\x86\x81", "video/webm"),
+    (ftyp(b"isom"), "video/mp4"),
+    (ftyp(b"mp42"), "video/mp4"),
+    (ftyp(b"M4V "), "video/mp4"),
+    (ftyp(b"qt  "), "video/quicktime"),
+    (ftyp(b"heic"), "image/heic"),
+    (ftyp(b"mif1"), "image/heif"),
+    (ftyp(b"avif"), "image/avif"),
+])
+def test_allowed_formats(head, content_type):
+    assert sniff_media_type(head) == content_type
+    assert content_type in MEDIA_CONTENT_TYPES
+
+
+@pytest.mark.parametrize("head", [
+    b"<html><script>",
+    b"<?xml version='1.0'?><svg",
+    b"%PDF-1.7\n",
+    ftyp(b"M4A "),  # audio
+    ftyp(b"abcd"),
+    b"",
+])
+def test_other_content_is_rejected(head):
+    assert sniff_media_type(head) is None
+
+
+def test_safety_headers():
+    assert media_safety_headers("image/png") == {"X-Content-Type-Options": "nosniff"}
+    assert media_safety_headers("text/html") == {
+        "X-Content-Type-Options": "nosniff",
+        "Content-Security-Policy": "sandbox",
+        "Content-Disposition": "attachment",
+    }
@@ -0,0 +1,145 @@
+import asyncio
+
+from pymongo.errors import AutoReconnect, WriteError
+
+import server
+from server import MessageWriteBuffer
+
+
+class RecordingBuffer(MessageWriteBuffer):
+    """Records the batches it would write instead of writing them to MongoDB"""
+
+    def __init__(self, *args, failures=0, error=None, write_delay=0.0, rejected=(), superseded=None, max_attempts=3, **kwargs):
+        super().__init__(*args, max_attempts=max_attempts, **kwargs)
+        self.failures = failures
+        self.error = error or RuntimeError("write failed")
+        self.write_delay = write_delay
+        self.rejected = set(rejected)
+        self.superseded = superseded or {}
+        self.attempts = []
+
+    async def _write(self, batch_id, batch, counted_in=()):
+        self.attempts.append((batch_id, [message["id"] for message in batch]))
+        await asyncio.sleep(self.write_delay)
+        if self.failures:
+            self.failures -= 1
+            raise self.error
+        if self.rejected.intersection(message["id"] for message in batch):
+            raise WriteError("document failed validation", code=121)
+        return [(message, self.superseded[message["id"]]) for message in batch if message["id"] in self.superseded]
+
+
+def message(message_id, room_id="r1", seq=1):
+    return {"id": message_id, "chat_room_id": room_id, "seq": seq, "sender_id": "a", "client_message_id": f"c-{message_id}"}
+
+
+def test_add_is_bounded():
+    buffer = RecordingBuffer(interval=1, max_pending=2)
+    assert buffer.add(message("m1"))
+    assert buffer.add(message("m2"))
+    assert not buffer.add(message("m3"))
+    assert buffer.depth() == 2
+    assert buffer.metrics()["overflows"] == 1
+
+
+def test_failed_batch_is_retried_as_the_same_batch():
+    buffer = RecordingBuffer(interval=1, max_pending=10, failures=1)
+
+    async def scenario():
+        buffer.add(message("m1", seq=1))
+        await buffer.flush()
+        assert buffer.depth() == 1
+        buffer.add(message("m2", seq=2))
+        assert buffer.pending_seqs("r1") == {1, 2}
+        assert buffer.find("r1", "c-m1")["id"] == "m1"
+        assert buffer.find("r2", "c-m1") is None
+        await buffer.flush()  # retries m1 alone, under its original batch id
+        await buffer.flush()
+
+    asyncio.run(scenario())
+    (first_id, first), (retry_id, retry), (next_id, following) = buffer.attempts
+    assert first == retry == ["m1"] and first_id == retry_id
+    assert following == ["m2"] and next_id != first_id
+    assert buffer.depth() == 0
+    assert buffer.stats["failed_flushes"] == 1
+    assert buffer.stats["messages_written"] == 2
+
+
+def test_close_waits_for_in_flight_flush_and_drains():
+    buffer = RecordingBuffer(interval=0.01, max_pending=10, write_delay=0.05)
+
+    async def scenario():
+        buffer.start()
+        buffer.add(message("m1"))
+        await asyncio.sleep(0.02)  # the loop is now writing m1
+        buffer.add(message("m2"))
+        await buffer.close()
+
+    asyncio.run(scenario())
+    assert [ids for _, ids in buffer.attempts] == [["m1"], ["m2"]]
+    assert buffer.depth() == 0
+    assert buffer.task is None
+
+
+def test_batch_that_keeps_failing_is_written_one_message_at_a_time():
+    buffer = RecordingBuffer(interval=1, max_pending=10, max_attempts=2, rejected={"m2"})
+
+    async def scenario():
+        for seq, message_id in enumerate(["m1", "m2", "m3"], 1):
+            buffer.add(message(message_id, seq=seq))
+        await buffer.flush()
+        await buffer.flush()
+        assert buffer.depth() == 3
+        await buffer.flush()
+
+    asyncio.run(scenario())
+    batch_id = buffer.attempts[0][0]
+    assert buffer.attempts[2:] == [
+        (f"{batch_id}:m1", ["m1"]), (f"{batch_id}:m2", ["m2"]), (f"{batch_id}:m3", ["m3"])
+    ]
+    assert buffer.depth() == 0
+    assert buffer.stats["dropped"] == 1
+    assert buffer.stats["messages_written"] == 2
+
+
+def test_unreachable_database_keeps_the_rest_of_the_batch():
+    buffer = RecordingBuffer(
+        interval=1, max_pending=10, max_attempts=1, failures=2, error=AutoReconnect("connection refused")
+    )
+
+    async def scenario():
+        buffer.add(message("m1", seq=1))
+        buffer.add(message("m2", seq=2))
+        await buffer.flush()  # batch attempt fails
+        await buffer.flush()  # m1 alone fails to connect
+        assert buffer.pending_seqs("r1") == {1, 2}
+        buffer.add(message("m3", seq=3))
+        await buffer.flush()
+        assert buffer.pending_seqs("r1") == {3}
+        await buffer.flush()
+
+    asyncio.run(scenario())
+    assert buffer.depth() == 0
+    assert buffer.stats["dropped"] == 0
+    assert buffer.stats["messages_written"] == 3
+
+
+def test_superseded_resend_is_corrected(monkeypatch):
+    stored = {"id": "stored", "chat_room_id": "r1", "seq": 1, "client_message_id": "c-m2"}
+    buffer = RecordingBuffer(interval=1, max_pending=10, superseded={"m2": stored})
+    emitted = []
+
+    async def emit(event, data, room=None, skip_sid=None):
+        emitted.append((event, room, data))
+
+    monkeypatch.setattr(server.sio, "emit", emit)
+
+    async def scenario():
+        buffer.add(message("m1", seq=2))
+        buffer.add(message("m2", seq=3))
+        await buffer.flush()
+
+    asyncio.run(scenario())
+    assert emitted == [("message_replaced", "r1", {"room_id": "r1", "replaced_id": "m2", "message": stored})]
+    assert buffer.stats["messages_written"] == 1
+    assert buffer.stats["superseded"] == 1
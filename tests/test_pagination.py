@@ -0,0 +1,52 @@
+from datetime import datetime
+
+import pytest
+from fastapi import HTTPException
+from pymongo import ASCENDING, DESCENDING
+
+from server import decode_cursor, encode_cursor, keyset_filter
+
+
+def test_cursor_round_trip_keeps_datetimes():
+    values = [datetime(2024, 5, 1, 12, 30, 15, 250000), "abc", 7, None]
+    assert decode_cursor(encode_cursor(values)) == values
+
+
+def test_cursor_is_url_safe():
+    cursor = encode_cursor(["?&/+=" * 10])
+    assert all(c.isalnum() or c in "-_" for c in cursor)
+
+
+@pytest.mark.parametrize("cursor", ["not base64!", "bm90IGpzb24", encode_cursor([{"$x": 1}])])
+def test_invalid_cursor_is_400(cursor):
+    with pytest.raises(HTTPException) as exc:
+        decode_cursor(cursor)
+    assert exc.value.status_code == 400
+
+
+def test_keyset_filter_descending():
+    created = datetime(2024, 1, 1)
+    sort = [("created_at", DESCENDING), ("id", DESCENDING)]
+    assert keyset_filter(sort, [created, "m"]) == {"$or": [
+        {"created_at": {"$not": {"$gte": created}}},
+        {"created_at": created, "id": {"$not": {"$gte": "m"}}},
+    ]}
+
+
+def test_keyset_filter_ascending():
+    sort = [("seq", ASCENDING), ("id", ASCENDING)]
+    assert keyset_filter(sort, [3, "m"]) == {"$or": [
+        {"seq": {"$gt": 3}},
+        {"seq": 3, "id": {"$gt": "m"}},
+    ]}
+
+
+def test_keyset_filter_missing_value():
+    # Missing values sort first ascending and last descending
+    assert keyset_filter([("rating", ASCENDING), ("id", ASCENDING)], [None, "m"]) == {"$or": [
+        {"rating": {"$ne": None}},
+        {"rating": None, "id": {"$gt": "m"}},
+    ]}
+    assert keyset_filter([("rating", DESCENDING), ("id", ASCENDING)], [None, "m"]) == {"$or": [
+        {"rating": None, "id": {"$gt": "m"}},
+    ]}
@@ -0,0 +1,56 @@
+import asyncio
+
+import server
+from server import PrincipalCache
+from tests.fakes import FakeCollection, FakeDatabase
+
+
+def test_principal_cache_hits_until_invalidated(monkeypatch):
+    users = FakeCollection([{"id": "u1", "name": "Asha"}])
+    monkeypatch.setattr(server, "db", FakeDatabase(users=users))
+    cache = PrincipalCache(max_size=10, ttl=60)
+
+    async def scenario():
+        user = await cache.get("u1")
+        user["name"] = "changed by a handler"
+        assert (await cache.get("u1"))["name"] == "Asha"
+        assert users.queries == 1
+        cache.invalidate("u1")
+        await cache.get("u1")
+        assert users.queries == 2
+        assert await cache.get("gone") is None
+
+    asyncio.run(scenario())
+    assert cache.metrics() == {"size": 1, "hits": 1, "misses": 3}
+
+
+def test_principal_cache_expires(monkeypatch):
+    users = FakeCollection([{"id": "u1"}])
+    monkeypatch.setattr(server, "db", FakeDatabase(users=users))
+    clock = [1000.0]
+    monkeypatch.setattr(server.time, "monotonic", lambda: clock[0])
+    cache = PrincipalCache(max_size=10, ttl=60)
+
+    async def scenario():
+        await cache.get("u1")
+        clock[0] += 59
+        await cache.get("u1")
+        assert users.queries == 1
+        clock[0] += 2
+        await cache.get("u1")
+        assert users.queries == 2
+
+    asyncio.run(scenario())
+
+
+def test_principal_cache_evicts_least_recently_used(monkeypatch):
+    users = FakeCollection([{"id": user_id} for user_id in ("u1", "u2", "u3")])
+    monkeypatch.setattr(server, "db", FakeDatabase(users=users))
+    cache = PrincipalCache(max_size=2, ttl=60)
+
+    async def scenario():
+        for user_id in ("u1", "u2", "u1", "u3"):
+            await cache.get(user_id)
+        assert list(cache.users) == ["u1", "u3"]
+
+    asyncio.run(scenario())
@@ -0,0 +1,69 @@
+import asyncio
+
+import server
+from server import RoomMembershipCache
+from tests.fakes import FakeCollection, FakeDatabase
+
+
+def test_room_members_are_loaded_once(monkeypatch):
+    rooms = FakeCollection([
+        {"id": "r1", "chat_type": "artist_artist", "participant1_id": "a", "participant2_id": "b"},
+        {"id": "r2", "chat_type": "venue_artist", "venue_user_id": "v", "provider_user_id": "a"},
+    ])
+    monkeypatch.setattr(server, "db", FakeDatabase(chat_rooms=rooms))
+    cache = RoomMembershipCache(max_size=10, ttl=60)
+
+    async def scenario():
+        assert await cache.get("r1") == frozenset({"a", "b"})
+        assert await cache.is_member("r1", "a")
+        assert not await cache.is_member("r1", "v")
+        assert await cache.get("r2") == frozenset({"v", "a"})
+        assert await cache.get("missing") is None
+        assert not await cache.is_member("missing", "a")
+        assert not await cache.is_member("r1", None)
+
+    asyncio.run(scenario())
+    # r1, r2 and two lookups of the missing room, which is not cached
+    assert rooms.queries == 4
+    assert cache.metrics() == {"size": 2, "hits": 2, "misses": 4}
+
+
+def test_room_members_evicts_least_recently_used(monkeypatch):
+    rooms = FakeCollection([
+        {"id": room_id, "chat_type": "artist_artist", "participant1_id": "a", "participant2_id": "b"}
+        for room_id in ("r1", "r2", "r3")
+    ])
+    monkeypatch.setattr(server, "db", FakeDatabase(chat_rooms=rooms))
+    cache = RoomMembershipCache(max_size=2, ttl=60)
+
+    async def scenario():
+        await cache.get("r1")
+        await cache.get("r2")
+        await cache.get("r1")
+        await cache.get("r3")  # evicts r2
+        assert list(cache.members) == ["r1", "r3"]
+        cache.invalidate(["r1", "unknown"])
+        assert list(cache.members) == ["r3"]
+
+    asyncio.run(scenario())
+
+
+def test_room_members_expire(monkeypatch):
+    rooms = FakeCollection([{"id": "r1", "chat_type": "artist_artist", "participant1_id": "a", "participant2_id": "b"}])
+    monkeypatch.setattr(server, "db", FakeDatabase(chat_rooms=rooms))
+    clock = [1000.0]
+    monkeypatch.setattr(server.time, "monotonic", lambda: clock[0])
+    cache = RoomMembershipCache(max_size=10, ttl=60)
+
+    async def scenario():
+        await cache.get("r1")
+        clock[0] += 59
+        await cache.get("r1")
+        assert rooms.queries == 1
+        # Deleted on another worker: the entry is dropped once it expires
+        rooms.documents.clear()
+        clock[0] += 2
+        assert await cache.get("r1") is None
+        assert "r1" not in cache.members
+
+    asyncio.run(scenario())
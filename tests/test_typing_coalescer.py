@@ -0,0 +1,79 @@
+import asyncio
+
+import pytest
+
+import server
+from server import TypingCoalescer
+
+
+@pytest.fixture
+def emitted(monkeypatch):
+    events = []
+
+    async def emit(event, data, room=None, skip_sid=None):
+        events.append((room, data["user_id"], data["is_typing"]))
+
+    monkeypatch.setattr(server.sio, "emit", emit)
+    return events
+
+
+def test_keystrokes_are_coalesced(emitted):
+    coalescer = TypingCoalescer(window=0.3, ttl=5)
+
+    async def scenario():
+        for _ in range(10):
+            await coalescer.update("r1", "a", True, "sid-a")
+        await coalescer.update("r1", "a", False, "sid-a")
+        # Stopping within the window is held back until the window ends
+        assert emitted == [("r1", "a", True)]
+        # The stop goes out when the window ends and is remembered for one more window
+        await asyncio.sleep(0.7)
+
+    asyncio.run(scenario())
+    assert emitted == [("r1", "a", True), ("r1", "a", False)]
+    assert coalescer.metrics() == {"active": 0, "received": 11, "emitted": 2}
+    assert not coalescer.tasks
+
+
+def test_typing_expires_without_refresh(emitted):
+    coalescer = TypingCoalescer(window=0.01, ttl=0.05)
+
+    async def scenario():
+        await coalescer.update("r1", "a", True, "sid-a")
+        await asyncio.sleep(0.2)
+
+    asyncio.run(scenario())
+    assert emitted == [("r1", "a", True), ("r1", "a", False)]
+
+
+def test_disconnect_clears_typing(emitted):
+    coalescer = TypingCoalescer(window=0, ttl=1)
+
+    async def scenario():
+        await coalescer.update("r1", "a", True, "sid-a")
+        await coalescer.update("r2", "b", True, "sid-b")
+        await coalescer.clear_sid("sid-a")
+
+    asyncio.run(scenario())
+    assert emitted == [("r1", "a", True), ("r2", "b", True), ("r1", "a", False)]
+
+
+def test_failed_timer_settle_is_logged(monkeypatch, caplog):
+    coalescer = TypingCoalescer(window=0.01, ttl=0.02)
+    calls = []
+
+    async def emit(event, data, room=None, skip_sid=None):
+        calls.append(data["is_typing"])
+        if not data["is_typing"]:
+            raise ConnectionError("emit failed")
+
+    monkeypatch.setattr(server.sio, "emit", emit)
+
+    async def scenario():
+        await coalescer.update("r1", "a", True, "sid-a")
+        await asyncio.sleep(0.2)
+
+    asyncio.run(scenario())
+    assert calls == [True, False]
+    assert "Typing state update failed: emit failed" in caplog.text
+    assert not coalescer.tasks